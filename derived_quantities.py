@@ -0,0 +1,111 @@
+import numpy as np
+
+# 3成分のベクトル場から計算する派生量の Output Format 名 (面ごとのスカラー場)
+TOPOLOGICAL_CHARGE = "topological charge"
+DIVERGENCE = "divergence"
+CURL = "curl (normal)"
+GRADIENT_SQUARED = "|grad m|^2"
+DERIVED_FORMATS = (TOPOLOGICAL_CHARGE, DIVERGENCE, CURL, GRADIENT_SQUARED)
+
+# 面に垂直な軸ごとの、右手系をなす面内の2軸 (u, v, 垂直な軸)
+IN_PLANE_AXES = {"x": ("y", "z"), "y": ("z", "x"), "z": ("x", "y")}
+
+AXIS_INDEX = {"x": 0, "y": 1, "z": 2}
+
+
+def is_derived_format(output_format):
+    """Output Format が派生量かどうかを返します"""
+    return output_format in DERIVED_FORMATS
+
+
+def get_plane_axes(unused_axis):
+    """unused_axis に垂直な面のデータの (行の軸, 列の軸) を返します (ファイルの z, y, x の順)"""
+    return tuple(axis for axis in ("z", "y", "x") if axis != unused_axis)
+
+
+def get_step_sizes(header, unused_axis):
+    """面内の2軸 (u, v) の格子間隔を返します"""
+    u_axis, v_axis = IN_PLANE_AXES[unused_axis]
+    return header[f"{u_axis}stepsize"], header[f"{v_axis}stepsize"]
+
+
+def gradient(array, header, unused_axis, axis):
+    """
+    面のデータ (..., 行, 列, 成分) の面内の軸 axis ('x', 'y' または 'z') 方向の微分を返します。
+
+    内部は中心差分、端は片側差分です (numpy.gradient)。その軸の格子点が1つの場合は 0 を返します。
+    """
+    array_axis = -3 if get_plane_axes(unused_axis)[0] == axis else -2
+    if array.shape[array_axis] < 2:
+        return np.zeros_like(array)
+    return np.gradient(array, header[f"{axis}stepsize"], axis=array_axis)
+
+
+def normalize(array):
+    """ベクトルを単位ベクトルにします (大きさが 0 のセルは 0 のまま)"""
+    magnitude = np.sqrt(np.sum(np.square(array), axis=-1, keepdims=True))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(magnitude > 0, array / magnitude, 0)
+
+
+def compute_derived_quantity(array, header, unused_axis, output_format):
+    """
+    3成分のベクトル場の面から、派生量のスカラー場を有限差分で計算します。
+
+    微分は面内の2軸 (u, v) のみで、面に垂直な方向の微分は含みません。
+    (u, v, 垂直な軸) が右手系になるように u, v を選びます (z 面なら x, y)。
+
+    - topological charge : q = m · (∂m/∂u × ∂m/∂v) / 4π (単位ベクトル m で計算)
+    - divergence : ∂m_u/∂u + ∂m_v/∂v
+    - curl (normal) : 面に垂直な成分 ∂m_v/∂u - ∂m_u/∂v
+    - |grad m|^2 : Σ_i (∂m_i/∂u)² + (∂m_i/∂v)² (単位ベクトル m で計算。交換エネルギー密度 / A)
+
+    divergence と curl はファイルの値 (磁化など) のまま微分します。
+
+    Parameters
+    ----------
+    array : numpy.ndarray
+        (..., 行, 列, 3) の形状の面のデータ (read_ovf_plane の戻り値など。先頭にフレームの軸があっても構いません)
+    header : dict
+        OVF ファイルのヘッダー情報 (xstepsize, ystepsize, zstepsize を使います)
+    unused_axis : str
+        面に垂直な軸 ('x', 'y' または 'z')
+    output_format : str
+        DERIVED_FORMATS のいずれか
+
+    Returns
+    -------
+    numpy.ndarray
+        (..., 行, 列) の形状の派生量
+    """
+    if array.shape[-1] != 3:
+        raise ValueError("Derived quantities require 3-component vector data.")
+
+    u_axis, v_axis = IN_PLANE_AXES[unused_axis]
+    u_index, v_index = AXIS_INDEX[u_axis], AXIS_INDEX[v_axis]
+
+    if output_format == DIVERGENCE:
+        return (gradient(array[..., u_index:u_index + 1], header, unused_axis, u_axis)[..., 0]
+                + gradient(array[..., v_index:v_index + 1], header, unused_axis, v_axis)[..., 0])
+
+    if output_format == CURL:
+        return (gradient(array[..., v_index:v_index + 1], header, unused_axis, u_axis)[..., 0]
+                - gradient(array[..., u_index:u_index + 1], header, unused_axis, v_axis)[..., 0])
+
+    m = normalize(array)
+    dm_du = gradient(m, header, unused_axis, u_axis)
+    dm_dv = gradient(m, header, unused_axis, v_axis)
+
+    if output_format == TOPOLOGICAL_CHARGE:
+        return np.sum(m * np.cross(dm_du, dm_dv), axis=-1) / (4 * np.pi)
+
+    if output_format == GRADIENT_SQUARED:
+        return np.sum(np.square(dm_du), axis=-1) + np.sum(np.square(dm_dv), axis=-1)
+
+    raise ValueError(f"Unsupported derived quantity: {output_format}")
+
+
+def get_skyrmion_number(charge_density, header, unused_axis):
+    """トポロジカル電荷密度を面全体で積分したスキルミオン数 Q を返します (先頭の軸はフレームごと)"""
+    du, dv = get_step_sizes(header, unused_axis)
+    return np.sum(charge_density, axis=(-2, -1)) * du * dv
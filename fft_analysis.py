@@ -0,0 +1,199 @@
+import os
+import tempfile
+
+import numpy as np
+
+# 解析の種類 ('temporal': セルごとの時間方向の FFT, 'spatial': フレームごとの面内 2次元 FFT)
+FFT_MODES = ("temporal", "spatial")
+
+# 時系列をメモリ上に保持する上限 (バイト)。超える場合は一時ファイルのメモリマップを使う
+DEFAULT_MEMORY_LIMIT = 1024**3
+
+# 時間方向の FFT で一度に変換するタイルのスペクトルのサイズ (バイト) の目安
+TILE_MEMORY = 64 * 1024**2
+
+# サンプリング間隔を等間隔とみなす相対誤差 (出力時間の丸め誤差を許容する)
+UNIFORM_INTERVAL_RTOL = 1e-3
+
+
+class TimeSeries:
+    """
+    面の時系列を (フレーム, 行, 列) の時間優先の配列に保持するクラスです。
+
+    配列が memory_limit を超える場合は一時ファイルのメモリマップに書き込みます
+    (close で一時ファイルを削除します)。各フレームのシミュレーション時間も保持します。
+    """
+
+    def __init__(self, frames, shape, dtype=np.float32, memory_limit=DEFAULT_MEMORY_LIMIT, directory=None):
+        self.path = None
+        nbytes = frames * int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if memory_limit is not None and nbytes > memory_limit:
+            fd, self.path = tempfile.mkstemp(suffix=".npy", prefix="ovf_fft_", dir=directory)
+            os.close(fd)
+            self.data = np.lib.format.open_memmap(self.path, mode="w+", dtype=dtype, shape=(frames,) + tuple(shape))
+        else:
+            self.data = np.empty((frames,) + tuple(shape), dtype=dtype)
+        self.times = np.full(frames, np.nan)
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def is_memmap(self):
+        return self.path is not None
+
+    def append(self, plane, time=None):
+        """次のフレームの面 (行, 列) とシミュレーション時間 (s) を書き込みます"""
+        if self.count >= len(self.data):
+            raise ValueError("More frames than allocated for the time series.")
+        self.data[self.count] = plane
+        if time is not None:
+            self.times[self.count] = time
+        self.count += 1
+
+    def get_data(self):
+        """書き込んだフレームまでの配列を返します"""
+        return self.data[:self.count]
+
+    def close(self):
+        """一時ファイルを削除します (メモリマップの参照が残っていて削除できない場合はそのまま残します)"""
+        self.data = None
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+
+def get_sampling_interval(times):
+    """
+    各フレームのシミュレーション時間からサンプリング間隔 (s) を返します (間隔の中央値)。
+
+    時間が無いフレームがある場合、時間順に並んでいない場合、間隔が等しくない場合
+    (スキップしたフレームや可変ステップの出力など) は ValueError を送出します。
+    """
+    times = np.asarray(times, dtype=float)
+    if len(times) < 2 or np.isnan(times).any():
+        raise ValueError("FFT analysis requires the simulation time in the header of every frame.")
+    intervals = np.diff(times)
+    if np.any(intervals <= 0):
+        raise ValueError("Frames must be in increasing simulation time for FFT analysis (use File order 'simulation time').")
+    dt = float(np.median(intervals))
+    if not np.allclose(intervals, dt, rtol=UNIFORM_INTERVAL_RTOL, atol=0):
+        raise ValueError(f"FFT analysis requires uniformly spaced frames (intervals range from {intervals.min():.4g} to {intervals.max():.4g} s).")
+    return dt
+
+
+def get_tile_rows(series_shape, tile_memory=TILE_MEMORY):
+    """時間方向の FFT で1タイルに含める行数を返します (スペクトルが tile_memory 程度になる行数)"""
+    frames, rows, cols = series_shape
+    row_bytes = (frames // 2 + 1) * cols * np.dtype(np.complex128).itemsize
+    return int(min(rows, max(1, tile_memory // row_bytes)))
+
+
+def iter_temporal_power_tiles(series, tile_memory=TILE_MEMORY):
+    """
+    時系列 (フレーム, 行, 列) を行方向のタイルに分け、各タイルの時間方向のパワースペクトルを返します。
+
+    各セルの時間平均を引き、ハン窓をかけてから実数 FFT を計算します。
+    一度に保持するのは1タイル分のデータとスペクトルのみです。
+
+    Yields
+    ------
+    tuple
+        (行のスライス, (周波数, タイルの行, 列) のパワースペクトル)
+    """
+    frames, rows, cols = series.shape
+    tile_rows = get_tile_rows(series.shape, tile_memory)
+    window = np.hanning(frames).astype(np.float32)[:, np.newaxis, np.newaxis]
+
+    for start in range(0, rows, tile_rows):
+        tile_slice = slice(start, min(start + tile_rows, rows))
+        tile = np.array(series[:, tile_slice], dtype=np.float32)
+        tile -= tile.mean(axis=0)
+        tile *= window
+        yield tile_slice, np.square(np.abs(np.fft.rfft(tile, axis=0)))
+
+
+def compute_temporal_power(series, dt, frequencies=None, tile_memory=TILE_MEMORY):
+    """
+    セルごとの時間方向の FFT から、指定した周波数のパワーマップを計算します。
+
+    Parameters
+    ----------
+    series : numpy.ndarray
+        (フレーム, 行, 列) の時系列 (TimeSeries.get_data の戻り値。メモリマップでも構いません)
+    dt : float
+        サンプリング間隔 (s)
+    frequencies : list of float, optional
+        パワーマップを求める周波数 (Hz)。最も近い FFT のビンを使います。
+        None または空の場合は、全セルの平均スペクトルのピーク (直流成分を除く) の周波数を使います
+        (この場合は時系列を2回読み込みます)。
+    tile_memory : int, optional
+        1タイルのスペクトルのサイズ (バイト) の目安
+
+    Returns
+    -------
+    tuple
+        (maps, map_frequencies, spectrum_frequencies, mean_spectrum)
+        maps は (周波数の数, 行, 列) のパワーマップ、map_frequencies は実際に使ったビンの周波数 (Hz)、
+        mean_spectrum は全セルで平均したパワースペクトルです。
+    """
+    frames, rows, cols = series.shape
+    spectrum_frequencies = np.fft.rfftfreq(frames, dt)
+
+    if frequencies:
+        bins = [int(np.argmin(np.abs(spectrum_frequencies - frequency))) for frequency in frequencies]
+    else:
+        # 1回目は平均スペクトルのみを求めてピークを探す
+        spectrum_sum = np.zeros(len(spectrum_frequencies))
+        for _, power in iter_temporal_power_tiles(series, tile_memory):
+            spectrum_sum += power.sum(axis=(1, 2))
+        bins = [int(np.argmax(spectrum_sum[1:])) + 1 if len(spectrum_sum) > 1 else 0]
+
+    maps = np.empty((len(bins), rows, cols), dtype=np.float32)
+    spectrum_sum = np.zeros(len(spectrum_frequencies))
+    for tile_slice, power in iter_temporal_power_tiles(series, tile_memory):
+        maps[:, tile_slice] = power[bins]
+        spectrum_sum += power.sum(axis=(1, 2))
+    mean_spectrum = spectrum_sum / (rows * cols)
+
+    return maps, spectrum_frequencies[bins], spectrum_frequencies, mean_spectrum
+
+
+def compute_spatial_power(series, row_step, col_step):
+    """
+    フレームごとの面内 2次元 FFT のパワースペクトルを全フレームで平均します。
+
+    各フレームの平均を引いてから変換し、波数 0 が中央になるように並べ替えます。
+    一度に変換するのは1フレームのみです。
+
+    Parameters
+    ----------
+    series : numpy.ndarray
+        (フレーム, 行, 列) の時系列
+    row_step, col_step : float
+        行方向・列方向の格子間隔 (m)
+
+    Returns
+    -------
+    tuple
+        (power, row_wavenumbers, col_wavenumbers)
+        power は (行, 列) の平均パワー、波数は各軸の空間周波数 (1/m、昇順) です。
+    """
+    frames, rows, cols = series.shape
+    power = np.zeros((rows, cols))
+    for frame in series:
+        frame = np.array(frame, dtype=np.float32)
+        frame -= frame.mean()
+        power += np.square(np.abs(np.fft.fft2(frame)))
+    power /= frames
+
+    row_wavenumbers = np.fft.fftshift(np.fft.fftfreq(rows, row_step))
+    col_wavenumbers = np.fft.fftshift(np.fft.fftfreq(cols, col_step))
+    return np.fft.fftshift(power), row_wavenumbers, col_wavenumbers
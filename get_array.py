@@ -1,63 +1,340 @@
+from functools import lru_cache
+from collections import OrderedDict
+
 import numpy as np
 from matplotlib.colors import hsv_to_rgb
 
-def get_array(self, array, header, variables):
-    # Get the currently selected axes
-    x_axis = variables["Graph X-Axis"]  # Graph X-Axis
-    y_axis = variables["Graph Y-Axis"]  # Graph Y-Axis
-    Nx = variables["N" + variables["Graph X-Axis"]]
-    Ny = variables["N" + variables["Graph Y-Axis"]]
-    plane_index = variables["Plane index"]
-    output_format = variables["Output Format"]
-    vector_dim = header["valuedim"]
+import derived_quantities as dq
 
-    # Determine the unused axis
+# Default number of hue and value bins of the RGB lookup table used for vector outputs (0 disables the table)
+DEFAULT_COLOR_LUT_SIZE = 512
+
+# Reference frames that can be subtracted from every exported frame ("none" exports the frames as they are)
+DIFFERENCE_MODES = ("none", "first frame", "displayed file")
+
+# Units of the ROI bounds: cell indices, or metres from the first cell edge (converted with the header step sizes)
+ROI_UNITS = ("cells", "m")
+
+class ArrayWorkspace:
+    """
+    Scratch buffers reused across frames by the float32 compute path.
+
+    Buffers are allocated on first use and kept while the requested shape and dtype stay the same,
+    so a batch export of equally sized frames allocates them only once.
+    Arrays returned by functions given a workspace are overwritten by the next call using it.
+    """
+
+    def __init__(self):
+        self.buffers = {}
+
+    def get(self, name, shape, dtype=np.float32):
+        """Return the buffer called name, reallocating it if the shape or dtype changed."""
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self.buffers[name] = buffer
+        return buffer
+
+# Number of extracted planes whose pyramids are kept by PyramidCache
+DEFAULT_PYRAMID_CACHE_SIZE = 8
+
+# Total bytes of the arrays kept by PyramidCache (large or float64 RGB planes evict older entries sooner)
+DEFAULT_PYRAMID_CACHE_BYTES = 512 * 1024**2
+
+def downsample_block_mean(array):
+    """
+    Halve the first two axes of array by averaging 2x2 blocks.
+
+    Odd sizes are padded by repeating the last row/column, so the result has
+    ceil(rows / 2) x ceil(cols / 2) pixels and covers the same extent.
+    Works for scalar (rows, cols) and RGB (rows, cols, 3) arrays; integer arrays are rounded back to their dtype.
+    """
+    rows, cols = array.shape[:2]
+    if rows % 2 or cols % 2:
+        array = np.pad(array, [(0, rows % 2), (0, cols % 2)] + [(0, 0)] * (array.ndim - 2), mode="edge")
+
+    blocks = array.reshape(array.shape[0] // 2, 2, array.shape[1] // 2, 2, *array.shape[2:])
+    mean = blocks.mean(axis=(1, 3), dtype=np.float32)
+    if np.issubdtype(array.dtype, np.integer):
+        return np.rint(mean).astype(array.dtype)
+    return mean.astype(array.dtype, copy=False)
+
+class ImagePyramid:
+    """
+    Multi-resolution levels of a displayed array, built lazily by block-mean downsampling.
+
+    levels[0] is the full-resolution array and each further level halves both image axes.
+    Levels are only built down to the coarsest one a request needs, so a single render
+    of a large plane costs at most one extra pass over the data.
+    """
+
+    def __init__(self, array):
+        self.levels = [array]
+        self.value_range = None
+
+    @property
+    def full_shape(self):
+        """(rows, cols) of the full-resolution array."""
+        return self.levels[0].shape[:2]
+
+    @property
+    def nbytes(self):
+        """Total bytes of the levels built so far."""
+        return sum(level.nbytes for level in self.levels)
+
+    def get_value_range(self):
+        """
+        Return the (min, max) of the full-resolution array ignoring NaNs, or (None, None) when it has no finite values.
+
+        Downsampled levels average out extremes, so color limits are always taken from levels[0]. The result is cached.
+        """
+        if self.value_range is None:
+            finite = self.levels[0][np.isfinite(self.levels[0])]
+            self.value_range = (float(finite.min()), float(finite.max())) if finite.size else (None, None)
+        return self.value_range
+
+    def get_level(self, target_shape=None):
+        """
+        Return the coarsest level with at least target_shape (rows, cols) pixels.
+
+        None returns the full-resolution array.
+        """
+        if target_shape is None:
+            return self.levels[0]
+
+        target_rows, target_cols = target_shape
+        index = 0
+        while True:
+            rows, cols = self.levels[index].shape[:2]
+            if -(-rows // 2) < target_rows or -(-cols // 2) < target_cols or min(rows, cols) < 2:
+                return self.levels[index]
+            if index + 1 == len(self.levels):
+                self.levels.append(downsample_block_mean(self.levels[index]))
+            index += 1
+
+class PyramidCache:
+    """
+    Least-recently-used cache of image pyramids keyed by file, plane/projection and component.
+
+    Values are (ImagePyramid, header, arrow_azimuthal_angle_array, arrow_magnitude_xy_array) tuples as used by
+    the preview, so redrawing the same plane with other graph settings (e.g. the colormap) skips reading the file
+    and recomputing components or derived quantities.
+    The cache holds at most max_entries values and max_bytes of arrays, but always keeps the newest value.
+    """
+
+    def __init__(self, max_entries=DEFAULT_PYRAMID_CACHE_SIZE, max_bytes=DEFAULT_PYRAMID_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def get_value_size(value):
+        """Bytes of the pyramid levels and arrays in a cached value (levels built after put are included)."""
+        return sum(item.nbytes for item in value if isinstance(item, (ImagePyramid, np.ndarray)))
+
+    @property
+    def nbytes(self):
+        return sum(self.get_value_size(value) for value in self.entries.values())
+
+    def get(self, key):
+        """Return the cached value for key (marking it as recently used), or None."""
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """Store value for key, dropping the least recently used entries beyond max_entries or max_bytes."""
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.nbytes > self.max_bytes):
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+def get_unused_axis(x_axis, y_axis):
+    """Return the axis perpendicular to the plane spanned by x_axis and y_axis."""
     all_axes = ["x", "y", "z"]
-    unused_axis = next(axis for axis in all_axes if axis not in [x_axis, y_axis])
+    return next(axis for axis in all_axes if axis not in [x_axis, y_axis])
+
+def get_debug_print(self):
+    """Return self.debug_print, or a no-op when called without a MainWindow (e.g. from scripts)."""
+    if self is None:
+        return lambda *args: None
+    return self.debug_print
 
+def get_vector_index(output_format, vector_dim):
+    """Return the component index for the output format (3 means the whole vector)."""
     if vector_dim == 1:
-        vector_index = 0
+        return 0
     elif "x" == output_format[-1]:
-        vector_index = 0
+        return 0
     elif "y" == output_format[-1]:
-        vector_index = 1
+        return 1
     elif "z" == output_format[-1]:
-        vector_index = 2
+        return 2
     else:
-        vector_index = 3
+        return 3
+
+def is_scalar_format(output_format):
+    """Return True if the output format is drawn as a scalar map (a component or a derived quantity) rather than RGB colors."""
+    return output_format[-1] in ["x", "y", "z"] or dq.is_derived_format(output_format)
+
+def is_plane_transposed(x_axis, y_axis):
+    """
+    Return True if the plane needs transposing so that rows follow the Graph Y-Axis.
+
+    Planes keep the file's (z, y, x) axis order, so the first plane axis is
+    the earlier of the two graph axes in that order. Unlike a shape check,
+    this also works for square planes.
+    """
+    unused_axis = get_unused_axis(x_axis, y_axis)
+    plane_axes = [axis for axis in ["z", "y", "x"] if axis != unused_axis]
+    return plane_axes[0] != y_axis
+
+def get_roi_region(variables, header):
+    """
+    Return the ROI of the displayed plane as {"rows": (start, stop), "cols": (start, stop), "shape": (rows, cols)}, or None.
+
+    Rows follow the Graph Y-Axis and columns the Graph X-Axis, stop is exclusive and "shape" is the full plane.
+    The "ROI X/Y min/max" bounds are inclusive cell indices, or lengths in metres from the first cell edge when
+    "ROI unit" is "m" (every cell overlapping the range is kept). Missing bounds default to the edges of the mesh.
+    """
+    bounds = {"rows": ("ROI Y", variables["Graph Y-Axis"]), "cols": ("ROI X", variables["Graph X-Axis"])}
+    if all(variables.get(key + suffix) is None for key, _ in bounds.values() for suffix in (" min", " max")):
+        return None
+
+    region = {}
+    for name, (key, axis) in bounds.items():
+        nodes = header[axis + "nodes"]
+        low, high = variables.get(key + " min"), variables.get(key + " max")
+        if variables.get("ROI unit") == "m":
+            step = header[axis + "stepsize"]
+            start = 0 if low is None else int(np.floor(low / step + 1e-6))
+            stop = nodes if high is None else int(np.ceil(high / step - 1e-6))
+        else:
+            start = 0 if low is None else int(low)
+            stop = nodes if high is None else int(high) + 1
+        start, stop = max(start, 0), min(stop, nodes)
+        if start >= stop:
+            raise ValueError(f"The ROI is empty along the {axis}-axis.")
+        region[name] = (start, stop)
+
+    region["shape"] = (header[variables["Graph Y-Axis"] + "nodes"], header[variables["Graph X-Axis"] + "nodes"])
+    return region
+
+def get_plane_roi(variables):
+    """
+    Return variables["ROI region"] as the ((row_start, row_stop), (col_start, col_stop)) ROI of the plane
+    in file axis order, as taken by read_ovf_plane, or None when no ROI is set.
+    """
+    region = variables.get("ROI region")
+    if region is None:
+        return None
+    if is_plane_transposed(variables["Graph X-Axis"], variables["Graph Y-Axis"]):
+        return region["cols"], region["rows"]
+    return region["rows"], region["cols"]
+
+def get_array(self, array, header, variables, is_plane=False, workspace=None):
+    # Process a single frame as a stack of one frame
+    output_array, arrow_azimuthal_angle_array, arrow_magnitude_xy_array = get_array_stack(self, array[np.newaxis], header, variables, is_plane=is_plane, workspace=workspace)
+
+    if arrow_azimuthal_angle_array is not None:
+        arrow_azimuthal_angle_array, arrow_magnitude_xy_array = arrow_azimuthal_angle_array[0], arrow_magnitude_xy_array[0]
+
+    return output_array[0], arrow_azimuthal_angle_array, arrow_magnitude_xy_array
+
+def get_array_stack(self, stack, header, variables, is_plane=False, workspace=None):
+    """
+    Batched get_array: extract the planes, RGB maps and arrow fields of all frames at once.
+
+    Parameters:
+    - self: object with a debug_print method (e.g. MainWindow), or None when used from scripts.
+    - stack: numpy.ndarray (or numpy.memmap) with shape (t, z, y, x, c),
+      or (t, rows, cols, c) planes as returned by read_ovf_plane when is_plane is True.
+    - header: OVF header of the frames (all frames must share the same mesh).
+    - variables: the same variables as get_array.
+    - is_plane: True if the stack already contains the selected planes (cropped to variables["ROI region"] if set).
+    - workspace: optional ArrayWorkspace reused between calls (e.g. one per batch export) to avoid
+      per-frame allocations; the returned arrays may then be overwritten by the next call.
+
+    Returns:
+    - output_array: (t, Ny, Nx) for scalar output formats (components and derived quantities), (t, Ny, Nx, 3) RGB colors otherwise.
+    - arrow_azimuthal_angle_array, arrow_magnitude_xy_array: (t, ny, nx) block-averaged arrow fields, or None.
+    """
+    debug_print = get_debug_print(self)
+
+    # Get the currently selected axes
+    x_axis = variables["Graph X-Axis"]  # Graph X-Axis
+    y_axis = variables["Graph Y-Axis"]  # Graph Y-Axis
+    plane_index = variables["Plane index"]
+    output_format = variables["Output Format"]
+
+    # Determine the unused axis
+    unused_axis = get_unused_axis(x_axis, y_axis)
+
+    vector_index = get_vector_index(output_format, header["valuedim"])
 
     # Determine the range for the unused axis
-    if unused_axis == "x":
-        output_array = array[:, :, plane_index, :]
+    # (skipped when the stack already holds the planes returned by read_ovf_plane)
+    if is_plane:
+        output_array = stack
+    elif unused_axis == "x":
+        output_array = stack[:, :, :, plane_index, :]
     elif unused_axis == "y":
-        output_array = array[:, plane_index, :, :]
+        output_array = stack[:, :, plane_index, :, :]
     elif unused_axis == "z":
-        output_array = array[plane_index, :, :, :]
+        output_array = stack[:, plane_index, :, :, :]
+
+    # Crop whole frames to the ROI before loading them (planes from the readers are already cropped)
+    plane_roi = get_plane_roi(variables)
+    if plane_roi is not None and not is_plane:
+        (row_start, row_stop), (col_start, col_stop) = plane_roi
+        output_array = output_array[:, row_start:row_stop, col_start:col_stop]
 
-    self.debug_print("get_array -  vector_index :", vector_index)
+    # Load only the selected planes into memory when the input is memory-mapped
+    if isinstance(output_array, np.memmap):
+        if workspace is None:
+            output_array = np.array(output_array)
+        else:
+            plane = workspace.get("plane", output_array.shape, output_array.dtype)
+            np.copyto(plane, output_array)
+            output_array = plane
+
+    debug_print("get_array_stack -  vector_index :", vector_index)
+
+    is_transposed = is_plane_transposed(x_axis, y_axis)
+
+    # Derived quantities are computed on the planes in file order (before transposing) with the header step sizes
+    if dq.is_derived_format(output_format):
+        output_array = dq.compute_derived_quantity(output_array, header, unused_axis, output_format)
+
+        if is_transposed:
+            output_array = np.swapaxes(output_array, 1, 2)
+
+        debug_print("get_array_stack -  output_array.shape :", output_array.shape)
+
+        return output_array, None, None
 
     if vector_index != 3:
-        output_array = output_array[:, :, vector_index]
-        
-        self.debug_print("get_array -  output_array.shape :", output_array.shape)
-        self.debug_print("get_array -  (Ny, Nx) :", (Ny, Nx))
-
-        if not output_array.shape == (Ny, Nx):
-            output_array = np.transpose(output_array)
-        
+        output_array = output_array[..., vector_index]
+
+        if is_transposed:
+            output_array = np.swapaxes(output_array, 1, 2)
+
+        debug_print("get_array_stack -  output_array.shape :", output_array.shape)
+
         return output_array, None, None
     else:
-        self.debug_print("get_array -  output_array.shape :", output_array.shape)
-        self.debug_print("get_array -  (Ny, Nx, 3) :", (Ny, Nx, 3))
-        
-        if not output_array.shape == (Ny, Nx, 3):
-            output_array = np.transpose(output_array, axes=(1, 0, 2))
-        
+        if is_transposed:
+            output_array = np.swapaxes(output_array, 1, 2)
+
+        debug_print("get_array_stack -  output_array.shape :", output_array.shape)
+
         idx_dict = {"x" : 0, "y" : 1, "z" : 2}
         vector_idx = (idx_dict[x_axis], idx_dict[y_axis], idx_dict[unused_axis])
-        self.debug_print("get_array -  vector_idx:", vector_idx)
-
-        self.debug_print("get_array -  self.get_rgb_colormap(output_array).shape :", get_rgb_colormap(output_array, vector_idx).shape)
+        debug_print("get_array_stack -  vector_idx:", vector_idx)
 
         arrow_azimuthal_angle_array, arrow_magnitude_xy_array = None, None
 
@@ -68,19 +345,31 @@ def get_array(self, array, header, variables):
             arrow_array = average_vector_field(self, output_array, block_size)
             arrow_azimuthal_angle_array, arrow_magnitude_xy_array = compute_azimuthal_and_magnitude(arrow_array, vector_idx)
 
-        return get_rgb_colormap(output_array, vector_idx), arrow_azimuthal_angle_array, arrow_magnitude_xy_array
+        # Color through the cached lookup table unless the exact float path is requested (size 0)
+        # A series-wide "Brightness range" replaces the per-frame brightness normalization
+        lut_size = variables.get("Color LUT size", DEFAULT_COLOR_LUT_SIZE)
+        brightness_range = variables.get("Brightness range")
+        if lut_size:
+            rgb_colors = get_rgb_colormap_lut(output_array, vector_idx, lut_size, brightness_range=brightness_range, workspace=workspace)
+        else:
+            rgb_colors = get_rgb_colormap(output_array, vector_idx, brightness_range=brightness_range)
+
+        return rgb_colors, arrow_azimuthal_angle_array, arrow_magnitude_xy_array
 
-def get_rgb_colormap(array, vector_idx):
+def get_rgb_colormap(array, vector_idx, brightness_range=None):
     """
     Given a 3D array with shape (nx, ny, 3) representing vector fields,
     compute and return an RGB color map based on azimuthal and polar angles.
+    Leading frame dimensions (t, nx, ny, 3) are supported; the brightness is normalized per frame.
 
     Parameters:
-    - array: numpy.ndarray with shape (nx, ny, 3), where the last dimension represents the vector components (vx, vy, vz).
+    - array: numpy.ndarray with shape (..., nx, ny, 3), where the last dimension represents the vector components (vx, vy, vz).
     - vector_idx: index of vector
+    - brightness_range: optional (min, max) brightness shared by all frames (e.g. from ovf_stats);
+      brightness outside the range is clipped. None normalizes each frame by its own min/max.
 
     Returns:
-    - rgb_colors: numpy.ndarray with shape (nx, ny, 3), representing the RGB colors.
+    - rgb_colors: numpy.ndarray with shape (..., nx, ny, 3), representing the RGB colors.
     """
     # Extract vector components
     vx, vy, vz = array[..., vector_idx[0]], array[..., vector_idx[1]], array[..., vector_idx[2]]
@@ -104,13 +393,18 @@ def get_rgb_colormap(array, vector_idx):
     # Map polar angle to brightness (1 for 0°, 0 for 180° in polar coordinates)
     brightness = 1 - (polar_angle_array / np.pi)
 
-    max_brightness = np.max(brightness)
-    min_brightness = np.min(brightness)
-
-    if max_brightness == min_brightness:
-        brightness_normalized = np.ones_like(brightness)  # 最大値と最小値が等しい場合、全て 1
+    # Normalize each frame separately (the last two axes are the image axes), or by the given range
+    if brightness_range is None:
+        max_brightness = np.max(brightness, axis=(-2, -1), keepdims=True)
+        min_brightness = np.min(brightness, axis=(-2, -1), keepdims=True)
     else:
-        brightness_normalized = (brightness - min_brightness) / (max_brightness - min_brightness)  # 0〜1に正規化
+        min_brightness, max_brightness = brightness_range
+        brightness = np.clip(brightness, min_brightness, max_brightness)
+    brightness_range = max_brightness - min_brightness
+
+    # 最大値と最小値が等しい場合は全て 1、それ以外は 0〜1に正規化
+    is_flat = brightness_range == 0
+    brightness_normalized = np.where(is_flat, 1.0, (brightness - min_brightness) / np.where(is_flat, 1.0, brightness_range))
 
     # Create an HSV color map (Hue from azimuthal, Value from brightness, Saturation=1)
     hsv_colors = np.zeros_like(array)
@@ -123,17 +417,125 @@ def get_rgb_colormap(array, vector_idx):
 
     return rgb_colors
 
+@lru_cache(maxsize=4)
+def get_hsv_lut(lut_size):
+    """
+    Return the cached RGB lookup table of get_rgb_colormap's HSV mapping.
+
+    The table has shape (lut_size * lut_size, 3) and dtype uint8; row hue_bin * lut_size + value_bin
+    holds the color of hue = hue_bin / (lut_size - 1) and value = value_bin / (lut_size - 1) with saturation 1.
+    """
+    hue, value = np.meshgrid(np.linspace(0, 1, lut_size), np.linspace(0, 1, lut_size), indexing="ij")
+    hsv_colors = np.stack([hue, np.ones_like(hue), value], axis=-1)
+    lut = np.rint(hsv_to_rgb(hsv_colors) * 255).astype(np.uint8).reshape(-1, 3)
+    lut.setflags(write=False)
+    return lut
+
+def get_rgb_colormap_lut(array, vector_idx, lut_size=DEFAULT_COLOR_LUT_SIZE, brightness_range=None, workspace=None):
+    """
+    Lookup-table version of get_rgb_colormap returning uint8 RGB colors.
+
+    The azimuthal and polar angles are computed in float32, quantized to lut_size bins
+    and gathered from the cached table of get_hsv_lut, which replaces the per-pixel hsv_to_rgb.
+    With the default 512 bins the colors match get_rgb_colormap within 2/255 per channel.
+    Cells with zero magnitude (e.g. outside the geometry) or NaN components are black
+    and are excluded from the brightness normalization.
+
+    Parameters:
+    - array: numpy.ndarray with shape (..., nx, ny, 3), where the last dimension represents the vector components (vx, vy, vz).
+    - vector_idx: index of vector
+    - lut_size: number of hue and value bins.
+    - brightness_range: optional (min, max) brightness shared by all frames, as in get_rgb_colormap.
+    - workspace: optional ArrayWorkspace; all intermediates are computed in its float32 buffers with in-place
+      ufuncs, so repeated calls on frames of the same shape allocate nothing. The returned array is then
+      a workspace buffer that is overwritten by the next call.
+
+    Returns:
+    - rgb_colors: numpy.ndarray with shape (..., nx, ny, 3) and dtype uint8, representing the RGB colors.
+    """
+    if workspace is None:
+        workspace = ArrayWorkspace()
+
+    shape = array.shape[:-1]
+    vx, vy, vz = array[..., vector_idx[0]], array[..., vector_idx[1]], array[..., vector_idx[2]]
+
+    # float32 scratch buffers (reused between frames of the same shape)
+    hue = workspace.get("hue", shape)
+    magnitude = workspace.get("magnitude", shape)
+    brightness = workspace.get("brightness", shape)
+    scratch = workspace.get("scratch", shape)
+    is_valid = workspace.get("is_valid", shape, bool)
+    is_invalid = workspace.get("is_invalid", shape, bool)
+    index = workspace.get("index", shape, np.intp)
+    rgb_colors = workspace.get("rgb_colors", shape + (3,), np.uint8)
+
+    # Hue: azimuthal angle mapped to [0, 1) and rotated by half a turn (same as get_rgb_colormap)
+    np.arctan2(vy, vx, out=hue)
+    hue *= 1 / (2 * np.pi)
+    hue %= 1.0
+
+    # Brightness: 1 for 0°, 0 for 180° polar angle
+    np.multiply(vx, vx, out=magnitude)
+    np.multiply(vy, vy, out=scratch)
+    magnitude += scratch
+    np.multiply(vz, vz, out=scratch)
+    magnitude += scratch
+    np.sqrt(magnitude, out=magnitude)
+    np.greater(magnitude, 0, out=is_valid)  # False for zero-length and NaN vectors
+    np.logical_not(is_valid, out=is_invalid)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        np.divide(vz, magnitude, out=brightness)
+    np.clip(brightness, -1, 1, out=brightness)
+    np.arccos(brightness, out=brightness)
+    brightness *= -1 / np.pi
+    brightness += 1
+
+    # Normalize each frame separately over its valid cells (the last two axes are the image axes), or by the given range
+    if brightness_range is None:
+        np.copyto(scratch, brightness)
+        np.copyto(scratch, -np.inf, where=is_invalid)
+        max_brightness = np.max(scratch, axis=(-2, -1), keepdims=True)
+        np.copyto(scratch, np.inf, where=is_invalid)
+        min_brightness = np.min(scratch, axis=(-2, -1), keepdims=True)
+    else:
+        min_brightness, max_brightness = brightness_range
+        np.clip(brightness, min_brightness, max_brightness, out=brightness)
+    with np.errstate(invalid="ignore"):
+        brightness_range = max_brightness - min_brightness
+        is_flat = brightness_range == 0
+        brightness -= min_brightness
+        brightness /= np.where(is_flat, 1, brightness_range)
+    np.copyto(brightness, 1, where=np.broadcast_to(is_flat, shape))
+
+    # Invalid cells are drawn black
+    np.copyto(brightness, 0, where=is_invalid)
+    np.copyto(hue, 0, where=is_invalid)
+
+    # Quantize to table indices and gather the colors
+    hue *= lut_size - 1
+    brightness *= lut_size - 1
+    np.rint(hue, out=hue)
+    np.rint(brightness, out=brightness)
+    np.copyto(index, hue, casting="unsafe")
+    index *= lut_size
+    np.add(index, brightness, out=index, casting="unsafe")
+
+    # mode="clip" lets take write into out without an intermediate buffer (indices are always in range)
+    np.take(get_hsv_lut(lut_size), index, axis=0, out=rgb_colors, mode="clip")
+
+    return rgb_colors
+
 def compute_azimuthal_and_magnitude(array, vector_idx):
     """
     Compute the azimuthal angle (φ) and the magnitude in the xy-plane for a given vector field.
 
     Parameters:
-    - array: numpy.ndarray with shape (nx, ny, 3), where the last dimension represents the vector components (vx, vy, vz).
+    - array: numpy.ndarray with shape (..., nx, ny, 3), where the last dimension represents the vector components (vx, vy, vz).
     - vector_idx: index of vector
 
     Returns:
-    - azimuthal_angle_array: numpy.ndarray with shape (nx, ny), representing the azimuthal angles (φ).
-    - magnitude_xy_array: numpy.ndarray with shape (nx, ny), representing the magnitudes in the xy-plane.
+    - azimuthal_angle_array: numpy.ndarray with shape (..., nx, ny), representing the azimuthal angles (φ).
+    - magnitude_xy_array: numpy.ndarray with shape (..., nx, ny), representing the magnitudes in the xy-plane.
     """
     # Extract vector components
     vx, vy, _ = array[..., vector_idx[0]], array[..., vector_idx[1]], array[..., vector_idx[2]]
@@ -150,15 +552,20 @@ def average_vector_field(self, array, block_size):
     """
     Compute the averaged vector field for an input array by averaging over block_size x block_size blocks.
     If the dimensions are not divisible by block_size, center the averaging window.
+    Leading frame dimensions (t, nx, ny, 3) are averaged frame by frame.
 
     Parameters:
-    - array: numpy.ndarray with shape (nx, ny, 3), where the last dimension represents the vector components (vx, vy, vz).
+    - self: object with a debug_print method (e.g. MainWindow), or None when used from scripts.
+    - array: numpy.ndarray with shape (..., nx, ny, 3), where the last dimension represents the vector components (vx, vy, vz).
     - block_size: int, the block size for averaging.
 
     Returns:
-    - averaged_array: numpy.ndarray with shape (nx//block_size, ny//block_size, 3) approximately, representing the averaged vector field.
+    - averaged_array: numpy.ndarray with shape (..., nx//block_size, ny//block_size, 3) approximately, representing the averaged vector field.
     """
-    nx, ny, _ = array.shape
+    debug_print = get_debug_print(self)
+
+    leading_shape = array.shape[:-3]
+    nx, ny, _ = array.shape[-3:]
 
     # Calculate start indices to center the averaging window
     start_x = (nx % block_size) // 2 if nx > block_size else 0
@@ -166,18 +573,18 @@ def average_vector_field(self, array, block_size):
     stop_x = nx + start_x - (nx % block_size) if nx > block_size else nx
     stop_y = ny + start_y - (ny % block_size) if ny > block_size else ny
 
-    self.debug_print("average_vector_field -  start_x, stop_x:", start_x, stop_x)
-    self.debug_print("average_vector_field -  start_y, stop_y:", start_y, stop_y)
-    self.debug_print("average_vector_field -  nx % block_size:", nx % block_size)
-    self.debug_print("average_vector_field -  ny % block_size:", ny % block_size)
+    debug_print("average_vector_field -  start_x, stop_x:", start_x, stop_x)
+    debug_print("average_vector_field -  start_y, stop_y:", start_y, stop_y)
+    debug_print("average_vector_field -  nx % block_size:", nx % block_size)
+    debug_print("average_vector_field -  ny % block_size:", ny % block_size)
 
     # Slice the array to ensure divisibility by block_size
-    sliced_array = array[start_x:stop_x, start_y:stop_y, :]
+    sliced_array = array[..., start_x:stop_x, start_y:stop_y, :]
 
     # New dimensions after slicing
-    new_nx, new_ny, _ = sliced_array.shape
+    new_nx, new_ny, _ = sliced_array.shape[-3:]
 
-    self.debug_print("average_vector_field -  sliced_array.shape:", sliced_array.shape)
+    debug_print("average_vector_field -  sliced_array.shape:", sliced_array.shape)
 
     averaged_array_nx = new_nx // block_size if nx > block_size else 1
     averaged_array_ny = new_ny // block_size if ny > block_size else 1
@@ -185,8 +592,8 @@ def average_vector_field(self, array, block_size):
     averaged_array_y_len = block_size if ny > block_size else ny
 
     # Reshape and compute the mean over block_size x block_size blocks
-    averaged_array = sliced_array.reshape(averaged_array_nx, averaged_array_x_len, averaged_array_ny, averaged_array_y_len, 3).mean(axis=(1, 3))
+    averaged_array = sliced_array.reshape(leading_shape + (averaged_array_nx, averaged_array_x_len, averaged_array_ny, averaged_array_y_len, 3)).mean(axis=(-4, -2))
 
-    self.debug_print("average_vector_field -  averaged_array.shape:", averaged_array.shape)
+    debug_print("average_vector_field -  averaged_array.shape:", averaged_array.shape)
 
     return averaged_array
\ No newline at end of file
@@ -11,8 +11,13 @@ from concurrent.futures import ThreadPoolExecutor
 import threading
 
 import read_ovf_files as rof
+import ovf_index as oi
+import ovf_loader as ol
+import ovf_store as ovs
+import ovf_stats as st
+import derived_quantities as dq
+import fft_analysis as fa
 import os
-import glob
 import numpy as np
 import json
 
@@ -52,6 +57,17 @@ class MainWindow(QMainWindow):
 
         self.is_debug = False
 
+        # 入力ディレクトリの OVF ヘッダーインデックス
+        self.ovf_index = {"files": {}}
+        self.ovf_index_directory = None
+        self.ovf_store = None  # 入力がストアファイルの場合の OvfStore
+
+        # プレビューで表示した面の画像ピラミッドのキャッシュ (ファイル・面・成分ごと)
+        self.pyramid_cache = ga.PyramidCache()
+
+        # ヘッダーから自動入力した Size の値 (軸ごと)。ユーザーが書き換えていない場合のみ入力の変更時に上書きする
+        self.auto_filled_sizes = {}
+
         # Set the style sheet for the main window
         font_size = f"{int(14 * scale_factor)}px"
         label_color = "#333333"
@@ -208,7 +224,13 @@ class MainWindow(QMainWindow):
             (", Graph X-Axis :", "Graph X-Axis", None),
             (", Y-Axis :", "Graph Y-Axis", None),
             (", Aspect ratio :", "Aspect ratio width", "1"),
-            (" : ", "Aspect ratio height", "1")
+            (" : ", "Aspect ratio height", "1"),
+            ("Projection :", "Projection", None),
+            (", ROI <i>X</i> :", "ROI X min", "0"),
+            (" - ", "ROI X max", "last"),
+            (", <i>Y</i> :", "ROI Y min", "0"),
+            (" - ", "ROI Y max", "last"),
+            (", ROI unit :", "ROI unit", None)
         ]
 
         self.format_combo = None
@@ -223,14 +245,14 @@ class MainWindow(QMainWindow):
             # ラベルの作成
             lbl = QLabel(label)
             lbl.setProperty("html", True)
-            if " : " in label:
+            if label in (" : ", " - "):
                 output_grid_layout.addWidget(lbl, row, col, Qt.AlignCenter)
             else:
                 output_grid_layout.addWidget(lbl, row, col)  # ラベルを配置
             
-            if "Aspect" in key:
+            if "Aspect" in key or key.startswith("ROI") and key != "ROI unit":
                 input_field = QLineEdit()
-                if "Aspect" in key:
+                if "Aspect" in key or key.startswith("ROI"):
                     input_field.setFixedWidth(aspect_width)
                 if placeholder:
                     input_field.setPlaceholderText(placeholder)
@@ -256,6 +278,15 @@ class MainWindow(QMainWindow):
                 elif key == "Plane index":
                     self.index_combo = combo
                     combo.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)             
+                elif key == "Projection":
+                    # "plane" は Plane index の1面、それ以外は面に垂直な方向に集約
+                    combo.addItems(["plane"] + list(rof.PROJECTION_MODES))
+                    combo.currentIndexChanged.connect(lambda: self.index_combo.setEnabled(self.grid_inputs["Projection"].currentText() == "plane"))
+                    self.grid_inputs[key] = combo
+                elif key == "ROI unit":
+                    # ROI の範囲の単位 (セル番号、または最初のセルの端からの長さ)
+                    combo.addItems(ga.ROI_UNITS)
+                    self.grid_inputs[key] = combo
 
                 output_grid_layout.addWidget(combo, row, col + 1)  # コンボボックスを配置
 
@@ -270,7 +301,8 @@ class MainWindow(QMainWindow):
             ("Colormap :", "Colormap", None),
             (", Reverse :", "is_Reverse", None),
             (", Colormap range :", "Z-Axis Displayed range min", "-0.5"),
-            (" ≤ <i>z</i> ≤ ", "Z-Axis Displayed range max", "0.5")
+            (" ≤ <i>z</i> ≤ ", "Z-Axis Displayed range max", "0.5"),
+            ("Color LUT size :", "Color LUT size", str(ga.DEFAULT_COLOR_LUT_SIZE))
         ]
         
         self.colormap_combo = None  # Initialize as None
@@ -630,7 +662,18 @@ class MainWindow(QMainWindow):
         save_setting_grid_data = [
             ("Extension :", "Extension", None),
             (", dpi :", "dpi", "300"),
-            (", GIF animation speed (ms) :", "GIF animation speed", "200")
+            (", GIF animation speed (ms) :", "GIF animation speed", "200"),
+            ("Prefetch (files) :", "Prefetch depth", "2"),
+            (", Prefetch memory (MB) :", "Prefetch memory", "512"),
+            (", File order :", "File order", None),
+            ("Frame start :", "Frame start", "0"),
+            (", Frame end :", "Frame end", "last"),
+            (", Frame stride :", "Frame stride", "1"),
+            ("Normalization :", "Normalization", None),
+            (", Difference :", "Difference", None),
+            (", FFT mode :", "FFT mode", None),
+            ("FFT frequencies (GHz) :", "FFT frequencies", "peak"),
+            (", FFT memory (MB) :", "FFT memory", "1024")
         ]
 
         # Save setting
@@ -648,6 +691,27 @@ class MainWindow(QMainWindow):
                 combo.addItems(["png", "jpg", "svg", "eps", "pdf", "gif"])  # Extensionの選択肢を追加
                 self.grid_inputs[key] = combo
                 save_setting_grid_layout.addWidget(combo, row, col + 1)  # コンボボックスを配置
+            elif key in ["Normalization"]:
+                combo = QComboBox()
+                combo.addItems(st.NORMALIZATIONS)  # 色の範囲の正規化方法の選択肢を追加
+                self.grid_inputs[key] = combo
+                save_setting_grid_layout.addWidget(combo, row, col + 1)  # コンボボックスを配置
+            elif key in ["Difference"]:
+                combo = QComboBox()
+                combo.addItems(ga.DIFFERENCE_MODES)  # 差分の基準フレームの選択肢を追加
+                self.grid_inputs[key] = combo
+                save_setting_grid_layout.addWidget(combo, row, col + 1)  # コンボボックスを配置
+            elif key in ["FFT mode"]:
+                combo = QComboBox()
+                combo.addItems(fa.FFT_MODES)  # FFT 解析の種類の選択肢を追加
+                self.grid_inputs[key] = combo
+                save_setting_grid_layout.addWidget(combo, row, col + 1)  # コンボボックスを配置
+            elif key in ["File order"]:
+                combo = QComboBox()
+                combo.addItems(oi.FILE_ORDERS)  # ファイルの並び順の選択肢を追加
+                combo.currentIndexChanged.connect(lambda: self.update_ovf_file_combo(self.input_line.text()))
+                self.grid_inputs[key] = combo
+                save_setting_grid_layout.addWidget(combo, row, col + 1)  # コンボボックスを配置
             else:
                 input_field = QLineEdit()
                 if placeholder:
@@ -701,14 +765,17 @@ class MainWindow(QMainWindow):
         button_layout = QHBoxLayout()
         self.check_button = QPushButton("Check")
         self.output_button = QPushButton("Output")
+        self.fft_button = QPushButton("FFT")
         self.cancel_button = QPushButton("Cancel")
         self.cancel_button.setEnabled(False)  # 初期状態では無効化
         button_layout.addWidget(self.check_button)
         button_layout.addWidget(self.cancel_button)
         button_layout.addWidget(self.output_button)
+        button_layout.addWidget(self.fft_button)
         right_layout.addLayout(button_layout)
         self.check_button.clicked.connect(self.show_images)
         self.output_button.clicked.connect(self.save_images)
+        self.fft_button.clicked.connect(self.analyze_fft)
         self.cancel_button.clicked.connect(self.cancel_operation)
 
         self.cancel_event = threading.Event()  # 中断フラグ
@@ -795,51 +862,111 @@ class MainWindow(QMainWindow):
     def update_on_input_change(self):
         """Handles all updates triggered by changes in the input_line."""
         directory = self.input_line.text()
+        self.refresh_ovf_index(directory)
         self.update_N(directory)
         self.update_footer_by_input_line(directory)
         self.update_output_format_options(self.get_first_ovf_file_header(directory))
         self.update_plane_index_options()
         self.update_ovf_file_combo(directory)
+
+    def refresh_ovf_index(self, directory):
+        """
+        入力ディレクトリのインデックスを更新します (新規・変更ファイルのヘッダーのみ読み込み)。
+        入力がアーカイブ (.zip / .tar) の場合は展開せずにメンバー一覧から、
+        ストアファイル (.ovfs) の場合はストアのインデックスを使います。
+        """
+        self.ovf_index = {"files": {}}
+        self.pyramid_cache.clear()
+        if self.ovf_store is not None:
+            self.ovf_store.close()
+            self.ovf_store = None
+        if ovs.is_store_file(directory):
+            try:
+                self.ovf_store = ovs.OvfStore(directory)
+                self.ovf_index = {"files": self.ovf_store.get_index_files()}
+            except (OSError, ValueError) as e:
+                self.debug_print("Error opening OVF store:", e)
+        elif os.path.isdir(directory) or rof.is_archive_file(directory):
+            try:
+                self.ovf_index = oi.update_index(directory)
+            except (OSError, ValueError) as e:
+                self.debug_print("Error indexing OVF files:", e)
+        self.ovf_index_directory = directory
+
+    def get_ovf_index_files(self, directory):
+        """入力ディレクトリの OVF ファイルのインデックス {ファイル名: エントリ} を返します"""
+        if directory != self.ovf_index_directory:
+            self.refresh_ovf_index(directory)
+        return self.ovf_index["files"]
     
     def update_footer_by_input_line(self, directory):
-        ovf_file_path_arr = glob.glob(os.path.join(directory, "*.ovf")) if not len(directory) == 0 else []
-        if ovf_file_path_arr:
-            self.footer_label.setText(f"{len(ovf_file_path_arr)} OVF files found in the selected directory.")
+        ovf_files = self.get_ovf_index_files(directory)
+        if ovf_files:
+            self.footer_label.setText(f"{len(ovf_files)} OVF files found in the selected directory.")
         else:
             self.footer_label.setText("No OVF files found in the selected directory.")
     
     def get_first_ovf_file_header(self, directory):
-        ovf_file_path_arr = glob.glob(os.path.join(directory, "*.ovf")) if not len(directory) == 0 else []
+        # 最初の OVF ファイルのヘッダーをインデックスから取得
         header = {}
-        if ovf_file_path_arr:
-            try:
-                # 最初の OVF ファイルのヘッダーを読み取る
-                header = rof.read_ovf_file(ovf_file_path_arr[0], output_mode='headers')
-            except Exception as e:
-                self.debug_print("Error reading OVF file:", e)
+        for entry in self.get_ovf_index_files(directory).values():
+            header = entry["header"] or {}
+            break
         self.debug_print("get_first_ovf_file_header - header :", header)
         return header
     
     def update_N(self, directory):
-        # OVF ファイルを取得
-        ovf_file_path_arr = glob.glob(os.path.join(directory, "*.ovf")) if not len(directory) == 0 else []
-        if ovf_file_path_arr:
-            try:
-                # 最初の OVF ファイルのヘッダーを読み取る
-                headers = rof.read_ovf_file(ovf_file_path_arr[0], output_mode='headers')
-                self.debug_print("update_N - headers :", headers)
-
-                # Nx, Ny, Nz に対応する値を設定
-                self.grid_inputs["Nx"].setText(str(headers.get("xnodes", "")))
-                self.grid_inputs["Ny"].setText(str(headers.get("ynodes", "")))
-                self.grid_inputs["Nz"].setText(str(headers.get("znodes", "")))
-            except Exception as e:
-                self.debug_print("Error reading OVF file:", e)
+        # 最初の OVF ファイルのヘッダーを取得
+        headers = self.get_first_ovf_file_header(directory)
+        if headers:
+            self.debug_print("update_N - headers :", headers)
+
+            # Nx, Ny, Nz に対応する値を設定
+            self.grid_inputs["Nx"].setText(str(headers.get("xnodes", "")))
+            self.grid_inputs["Ny"].setText(str(headers.get("ynodes", "")))
+            self.grid_inputs["Nz"].setText(str(headers.get("znodes", "")))
 
         else:
             self.grid_inputs["Nx"].setText("")
             self.grid_inputs["Ny"].setText("")
             self.grid_inputs["Nz"].setText("")
+
+        self.update_size_by_headers(headers or {})
+
+    def update_size_by_headers(self, headers):
+        """
+        ヘッダーのステップサイズとノード数から Size (と Overall range) を設定します。
+        未入力の Size と、前回ヘッダーから自動入力した値のままの Size のみを上書きし、ユーザーが入力した値は変更しません。
+        Overall range も、未入力か元の Size から設定した値 (0 〜 Size) のままの場合のみ更新します。
+        """
+        for axis in ("x", "y", "z"):
+            current_text = self.grid_inputs["Size" + axis].text()
+            if current_text and current_text != self.auto_filled_sizes.get(axis):
+                continue
+
+            stepsize = headers.get(axis + "stepsize")
+            nodes = headers.get(axis + "nodes")
+            size_text = f"{stepsize * nodes:g}" if stepsize and nodes else ""
+            self.auto_filled_sizes[axis] = size_text
+            if size_text != current_text:
+                is_range_from_size = self.is_overall_range_from_size(axis, current_text)
+                self.grid_inputs["Size" + axis].setText(size_text)
+                if is_range_from_size:
+                    self.update_overall_range_by_size(axis)
+
+    def is_overall_range_from_size(self, size_axis, size_text):
+        """グラフの軸の Overall range が未入力、または size_text から設定した値 (0 〜 Size) のままかを返します"""
+        graph_axes = (self.axis_combos[0].currentText(), self.axis_combos[1].currentText())
+        if size_axis not in graph_axes:
+            return True
+        set_axis = "X" if size_axis == graph_axes[0] else "Y"
+        range_text = (self.grid_inputs[set_axis + "-Axis Overall range min"].text(), self.grid_inputs[set_axis + "-Axis Overall range max"].text())
+        if range_text == ("", ""):
+            return True
+        try:
+            return range_text == ("0", str(float(size_text)))
+        except ValueError:
+            return False
     
     def update_axis_options(self, changed_axis):
         """
@@ -936,11 +1063,11 @@ class MainWindow(QMainWindow):
 
         # Define options based on the value
         if valuedim == 3:
-            options = ["m", "m_x", "m_y", "m_z"]
+            options = ["m", "m_x", "m_y", "m_z"] + list(dq.DERIVED_FORMATS)
         elif valuedim == 1:
             try:
-                option_item = header["valuelabels"]
-            except KeyError:
+                option_item = header["valuelabels"][0]
+            except (KeyError, IndexError):
                 option_item = "any"
             options = [option_item]
         else:
@@ -959,15 +1086,14 @@ class MainWindow(QMainWindow):
         Parameters:
         - directory (str): Path to the directory to search for OVF files.
         """
-        # OVFファイルを取得
-        ovf_file_paths = glob.glob(os.path.join(directory, "*.ovf"))
+        # OVFファイルをインデックスから取得し、選択した順に並べる
+        ovf_file_names = oi.sort_ovf_files(self.get_ovf_index_files(directory), self.grid_inputs["File order"].currentText())
 
         # コンボボックスをリセット
         self.ovf_file_combo.clear()
 
-        if ovf_file_paths:
-            # ファイル名を取得してコンボボックスに追加
-            ovf_file_names = [os.path.basename(path) for path in ovf_file_paths]
+        if ovf_file_names:
+            # ファイル名をコンボボックスに追加
             self.ovf_file_combo.addItems(ovf_file_names)
             self.ovf_file_combo.setEnabled(True)  # コンボボックスを有効化
         else:
@@ -1038,7 +1164,7 @@ class MainWindow(QMainWindow):
 
         if not output_format == "":
             for colormap_name, base64_data in cs.colormap_data.items():
-                if output_format and output_format[-1] in ["x", "y", "z"]:
+                if output_format and ga.is_scalar_format(output_format):
                     pass
                 elif colormap_name != "hsv":
                     continue  
@@ -1051,7 +1177,7 @@ class MainWindow(QMainWindow):
             self.colormap_combo.setCurrentText(current_colormap_name)
         
         # z_axis_groupの有効/無効を切り替え
-        if output_format and output_format[-1] in ["x", "y", "z"]:
+        if output_format and ga.is_scalar_format(output_format):
             # Show Colorbarの有効化
             self.z_axis_group.setEnabled(True)
             self.z_axis_group.setStyleSheet("QGroupBox::title { color: black; }")
@@ -1105,6 +1231,7 @@ class MainWindow(QMainWindow):
         directory = QFileDialog.getExistingDirectory(self, "Select Directory")
         if directory:
             self.input_line.setText(directory)
+            self.refresh_ovf_index(directory)
             self.update_footer_by_input_line(directory)
             self.update_N(directory)
             self.update_output_format_options(self.get_first_ovf_file_header(directory))
@@ -1211,6 +1338,9 @@ class MainWindow(QMainWindow):
         
         self.update_colormap(self.format_combo.currentText(), self.colormap_combo.currentText())
 
+        # 投影モードでは Plane index を使わない
+        self.index_combo.setEnabled(self.grid_inputs["Projection"].currentText() == "plane")
+
         # 中断ボタンを無効化
         if hasattr(self, 'cancel_button'):
             self.cancel_button.setEnabled(False)
@@ -1229,7 +1359,14 @@ class MainWindow(QMainWindow):
                 "Nz": int(self.grid_inputs["Nz"].text()) if self.grid_inputs["Nz"].text().isdigit() else None,
                 "Plane index": int(self.index_combo.currentText()) if self.index_combo.currentText().isdigit() else None,
                 "Block Size": int(self.grid_inputs["Block Size"].text()) if self.grid_inputs["Block Size"].text().isdigit() else 5,
+                "Color LUT size": int(self.grid_inputs["Color LUT size"].text()) if self.grid_inputs["Color LUT size"].text().isdigit() else ga.DEFAULT_COLOR_LUT_SIZE,
                 "dpi": int(self.grid_inputs["dpi"].text()) if self.grid_inputs["dpi"].text().isdigit() else 300,
+                "Prefetch depth": int(self.grid_inputs["Prefetch depth"].text()) if self.grid_inputs["Prefetch depth"].text().isdigit() else 2,
+                "Prefetch memory": int(self.grid_inputs["Prefetch memory"].text()) if self.grid_inputs["Prefetch memory"].text().isdigit() else 512,
+                "FFT memory": int(self.grid_inputs["FFT memory"].text()) if self.grid_inputs["FFT memory"].text().isdigit() else 1024,
+                "Frame start": int(self.grid_inputs["Frame start"].text()) if self.grid_inputs["Frame start"].text().isdigit() else 0,
+                "Frame end": int(self.grid_inputs["Frame end"].text()) if self.grid_inputs["Frame end"].text().isdigit() else None,
+                "Frame stride": int(self.grid_inputs["Frame stride"].text()) if self.grid_inputs["Frame stride"].text().isdigit() else 1,
 
                 # float 型の変数
                 "Sizex": float(self.grid_inputs["Sizex"].text()) if self.grid_inputs["Sizex"].text() else None,
@@ -1241,6 +1378,10 @@ class MainWindow(QMainWindow):
                 "Bottom": float(self.grid_inputs["Bottom"].text()) if self.grid_inputs["Bottom"].text() else 0.5,
                 "Colorbar Width": float(self.grid_inputs["Colorbar Width"].text()) if self.grid_inputs["Colorbar Width"].text() else float('nan'),
                 "Between Graph and Colorbar": float(self.grid_inputs["Between Graph and Colorbar"].text()) if self.grid_inputs["Between Graph and Colorbar"].text() else float('nan'),
+                "ROI X min": float(self.grid_inputs["ROI X min"].text()) if self.grid_inputs["ROI X min"].text() else None,
+                "ROI X max": float(self.grid_inputs["ROI X max"].text()) if self.grid_inputs["ROI X max"].text() else None,
+                "ROI Y min": float(self.grid_inputs["ROI Y min"].text()) if self.grid_inputs["ROI Y min"].text() else None,
+                "ROI Y max": float(self.grid_inputs["ROI Y max"].text()) if self.grid_inputs["ROI Y max"].text() else None,
                 "X-Axis Overall range min": float(self.grid_inputs["X-Axis Overall range min"].text()) if self.grid_inputs["X-Axis Overall range min"].text() else None,
                 "X-Axis Overall range max": float(self.grid_inputs["X-Axis Overall range max"].text()) if self.grid_inputs["X-Axis Overall range max"].text() else None,
                 "X-Axis Displayed range min": float(self.grid_inputs["X-Axis Displayed range min"].text()) if self.grid_inputs["X-Axis Displayed range min"].text() else None,
@@ -1278,6 +1419,13 @@ class MainWindow(QMainWindow):
                 "Z-Axis Unit": self.grid_inputs["Z-Axis Unit"].text(),
                 "Z-Axis SI prefix": self.prefix_combos[2].currentText(),
                 "Extension": self.grid_inputs["Extension"].currentText(),
+                "File order": self.grid_inputs["File order"].currentText(),
+                "Projection": self.grid_inputs["Projection"].currentText(),
+                "ROI unit": self.grid_inputs["ROI unit"].currentText(),
+                "Normalization": self.grid_inputs["Normalization"].currentText(),
+                "Difference": self.grid_inputs["Difference"].currentText(),
+                "FFT mode": self.grid_inputs["FFT mode"].currentText(),
+                "FFT frequencies": self.grid_inputs["FFT frequencies"].text(),
                 "X-Axis Tick Label": self.grid_inputs["X-Axis Tick Label"].text(),
                 "Y-Axis Tick Label": self.grid_inputs["Y-Axis Tick Label"].text(),
                 "Z-Axis Tick Label": self.grid_inputs["Z-Axis Tick Label"].text(),
@@ -1313,17 +1461,28 @@ class MainWindow(QMainWindow):
             if len(ovf_file_path) == 0:
                 raise ValueError("No OVF files found.")
 
-            # OVFファイルの読み込み
-            data, header = rof.read_ovf_file(ovf_file_path, output_mode='both')
-            self.debug_print("show_images - data.shape :", data.shape)
-
-            # 配列の取得と処理
-            array, arrow_azimuthal_angle_array, arrow_magnitude_xy_array = ga.get_array(self, data, header, variables)
+            unused_axis = ga.get_unused_axis(variables["Graph X-Axis"], variables["Graph Y-Axis"])
+            index_entry = self.get_ovf_index_files(variables["Input Directory"]).get(variables["Displayed OVF File"]) or {}
+            variables = self.apply_roi(variables, index_entry.get("header") or rof.read_ovf_file(ovf_file_path, output_mode='headers'))
+
+            pyramid_key = self.get_pyramid_key(ovf_file_path, variables)
+            cached = self.pyramid_cache.get(pyramid_key)
+            if cached is None:
+                # OVFファイルの読み込み (ROI を指定した場合は ROI の範囲のみ)
+                data, header = self.read_ovf_plane(ovf_file_path, unused_axis, variables["Plane index"], dtype=np.float32, projection=variables["Projection"], roi=ga.get_plane_roi(variables))
+                self.debug_print("show_images - data.shape :", data.shape)
+
+                # 配列の取得と処理
+                array, arrow_azimuthal_angle_array, arrow_magnitude_xy_array = ga.get_array(self, data, header, variables, is_plane=True)
+                cached = (ga.ImagePyramid(array), header, arrow_azimuthal_angle_array, arrow_magnitude_xy_array)
+                self.pyramid_cache.put(pyramid_key, cached)
+            pyramid, header, arrow_azimuthal_angle_array, arrow_magnitude_xy_array = cached
+            array = pyramid.get_level()
             self.debug_print("show_images - array.shape :", array.shape)
 
             output_format = variables["Output Format"]
 
-            if output_format[-1] in ["x", "y", "z"]:
+            if ga.is_scalar_format(output_format):
                 if array.ndim != 2:
                     raise ValueError("Only 2D arrays are supported for display.")
             else:
@@ -1331,16 +1490,21 @@ class MainWindow(QMainWindow):
                     raise ValueError("Only 3D arrays are supported for display.")
 
             # 画像生成
-            scaled_pixmap = mi.make_image(self, array, variables, mode="check", arrow_azimuthal_angle_array=arrow_azimuthal_angle_array, arrow_magnitude_xy_array=arrow_magnitude_xy_array)
+            scaled_pixmap = mi.make_image(self, array, variables, mode="check", arrow_azimuthal_angle_array=arrow_azimuthal_angle_array, arrow_magnitude_xy_array=arrow_magnitude_xy_array, pyramid=pyramid)
             # scaled_pixmap = mi.make_image(self, array, variables, mode="check")
 
-            # 最大値と最小値を取得
-            max_intensity = np.max(array)
-            min_intensity = np.min(array)
-            max_str = f"{max_intensity:.2e}"
-            min_str = f"{min_intensity:.2e}"
+            # 最大値と最小値を取得 (ベクトル出力は RGB の色 (uint8 など) のため表示しない)
+            if array.ndim == 2:
+                min_intensity, max_intensity = pyramid.get_value_range()
+                max_str = f"{max_intensity:.2e}" if max_intensity is not None else "nan"
+                min_str = f"{min_intensity:.2e}" if min_intensity is not None else "nan"
+                footer_text = f"Maximum intensity: {max_str}, Minimum intensity: {min_str} in the selected file."
+            else:
+                footer_text = "Vector output of the selected file is shown as colors."
+            if output_format == dq.TOPOLOGICAL_CHARGE:
+                footer_text += f" Skyrmion number: {dq.get_skyrmion_number(array, header, unused_axis):.3f}"
 
-            QMetaObject.invokeMethod(self.footer_label, "setText", Q_ARG(str, f"Maximum intensity: {max_str}, Minimum intensity: {min_str} in the selected file."))
+            QMetaObject.invokeMethod(self.footer_label, "setText", Q_ARG(str, footer_text))
 
             # QMetaObject.invokeMethod(self.graph_display, "setPixmap", scaled_pixmap)
             self.update_image_display(scaled_pixmap)
@@ -1350,6 +1514,22 @@ class MainWindow(QMainWindow):
         finally:
             QMetaObject.invokeMethod(self, "enable_inputs", Qt.QueuedConnection)
 
+    def get_pyramid_key(self, ovf_file_path, variables):
+        """
+        プレビューの画像ピラミッドのキャッシュキーを返します。
+        ファイル (サイズ・更新時刻を含む)、面または投影、成分と、get_array の結果に影響する設定の組です。
+        """
+        entry = self.ovf_index["files"].get(variables["Displayed OVF File"], {})
+        if os.path.isfile(ovf_file_path):
+            stat = os.stat(ovf_file_path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+        else:
+            signature = (entry.get("size"), entry.get("mtime"))
+
+        plane = variables["Projection"] if variables["Projection"] != "plane" else variables["Plane index"]
+        return (ovf_file_path, signature, variables["Graph X-Axis"], variables["Graph Y-Axis"], plane, variables["Output Format"],
+                variables["Color LUT size"], variables["Show Arrows"], variables["Block Size"], ga.get_plane_roi(variables))
+
     @pyqtSlot(object)
     def update_image_display(self, pixmap):
         if pixmap is not None:
@@ -1369,30 +1549,44 @@ class MainWindow(QMainWindow):
         QMetaObject.invokeMethod(self.progress_bar, "show", Qt.QueuedConnection)
         QMetaObject.invokeMethod(self.progress_bar, "setValue", Q_ARG(int, 0))
 
-        ovf_file_path_arr = glob.glob(os.path.join(variables["Input Directory"], "*.ovf"))
-        total_steps = len(ovf_file_path_arr)
-        
         try:
+            ovf_files, complete_file_names, skipped_message = self.select_ovf_files(variables)
+
+            ovf_file_path_arr = [os.path.join(variables["Input Directory"], name) for name in complete_file_names]
+            total_steps = len(ovf_file_path_arr)
+
             if len(ovf_file_path_arr) == 0:
                 raise ValueError("No OVF files found.")
+
+            # ROI を最初のファイルの格子で面の範囲に変換 (全フレームで共通)
+            variables = self.apply_roi(variables, ovf_files[complete_file_names[0]]["header"])
+
+            # 差分モードの基準の面を一度だけ読み込み、各フレームから引く
+            reference_name, reference = self.get_reference_plane(variables, complete_file_names)
+
+            # 全フレーム共通の色の範囲を設定 (Normalization が 'per frame' の場合は差分モードを除き従来どおりフレームごと)
+            variables = self.apply_series_normalization(variables, complete_file_names, ovf_files, reference_name, reference)
+
+            # フレーム間で再利用する作業用バッファ (各フレームの画像は保存後に上書きされる)
+            workspace = ga.ArrayWorkspace()
+            unreadable = []
             if variables["Extension"] == "gif":
                 frames = []
-                for step, ovf_file_path in enumerate(ovf_file_path_arr):
+                for step, saved_name, header, data in self.iter_ovf_frames(ovf_file_path_arr, variables, reference, unreadable):
                     if self.cancel_event.is_set():  # 中断フラグを確認
                         raise RuntimeError("Operation canceled by the user.")
-                    data, header = rof.read_ovf_file(ovf_file_path, output_mode='both')
-                    array, arrow_azimuthal_angle_array, arrow_magnitude_xy_array = ga.get_array(self, data, header, variables)
+                    array, arrow_azimuthal_angle_array, arrow_magnitude_xy_array = ga.get_array(self, data, header, variables, is_plane=True, workspace=workspace)
 
                     output_format = variables["Output Format"]
 
-                    if output_format[-1] in ["x", "y", "z"]:
+                    if ga.is_scalar_format(output_format):
                         if array.ndim != 2:
                             raise ValueError("Only 2D arrays are supported for display.")
                     else:
                         if array.ndim != 3:
                             raise ValueError("Only 3D arrays are supported for display.")
 
-                    pixmap, scaled_pixmap = mi.make_image(self, array, variables, mode="animation", arrow_azimuthal_angle_array=arrow_azimuthal_angle_array, arrow_magnitude_xy_array=arrow_magnitude_xy_array)
+                    pixmap, scaled_pixmap = mi.make_image(self, array, variables, mode="animation", arrow_azimuthal_angle_array=arrow_azimuthal_angle_array, arrow_magnitude_xy_array=arrow_magnitude_xy_array, pyramid=ga.ImagePyramid(array))
 
                     frames.append(pixmap)
 
@@ -1403,35 +1597,34 @@ class MainWindow(QMainWindow):
 
                 # GIFアニメーションの生成
                 mi.create_gif(self, frames, variables)
-                QMetaObject.invokeMethod(self.footer_label, "setText", Q_ARG(str, f"GIF animation saved with {len(frames)} frames in the selected directory."))
+                QMetaObject.invokeMethod(self.footer_label, "setText", Q_ARG(str, f"GIF animation saved with {len(frames)} frames in the selected directory.{skipped_message}{self.get_unreadable_message(unreadable)}"))
 
                 QMetaObject.invokeMethod(self.progress_bar, "setValue", Q_ARG(int, 100))
             else:
-                for step, ovf_file_path in enumerate(ovf_file_path_arr):
+                saved_count = 0
+                for step, saved_name, header, data in self.iter_ovf_frames(ovf_file_path_arr, variables, reference, unreadable):
                     if self.cancel_event.is_set():  # 中断フラグを確認
                         raise RuntimeError("Operation canceled by the user.")
-                    data, header = rof.read_ovf_file(ovf_file_path, output_mode='both')
-                    array, arrow_azimuthal_angle_array, arrow_magnitude_xy_array = ga.get_array(self, data, header, variables)
-
-                    saved_name = os.path.splitext(os.path.basename(ovf_file_path))[0]
+                    array, arrow_azimuthal_angle_array, arrow_magnitude_xy_array = ga.get_array(self, data, header, variables, is_plane=True, workspace=workspace)
 
                     output_format = variables["Output Format"]
 
-                    if output_format[-1] in ["x", "y", "z"]:
+                    if ga.is_scalar_format(output_format):
                         if array.ndim != 2:
                             raise ValueError("Only 2D arrays are supported for display.")
                     else:
                         if array.ndim != 3:
                             raise ValueError("Only 3D arrays are supported for display.")
 
-                    scaled_pixmap = mi.make_image(self, array, variables, mode="save", saved_name=saved_name, arrow_azimuthal_angle_array=arrow_azimuthal_angle_array, arrow_magnitude_xy_array=arrow_magnitude_xy_array)
+                    scaled_pixmap = mi.make_image(self, array, variables, mode="save", saved_name=saved_name, arrow_azimuthal_angle_array=arrow_azimuthal_angle_array, arrow_magnitude_xy_array=arrow_magnitude_xy_array, pyramid=ga.ImagePyramid(array))
+                    saved_count += 1
 
                     self.update_image_display(scaled_pixmap)
 
                     progress = int((step + 1) / total_steps * 100)
                     QMetaObject.invokeMethod(self.progress_bar, "setValue", Q_ARG(int, progress))
 
-                QMetaObject.invokeMethod(self.footer_label, "setText", Q_ARG(str, f"{len(ovf_file_path_arr)} {variables['Extension'].upper()} files were saved in the selected directory."))
+                QMetaObject.invokeMethod(self.footer_label, "setText", Q_ARG(str, f"{saved_count} {variables['Extension'].upper()} files were saved in the selected directory.{skipped_message}{self.get_unreadable_message(unreadable)}"))
         except RuntimeError as e:
             QMetaObject.invokeMethod(self.footer_label, "setText", Q_ARG(str, str(e)))
         except Exception as e:
@@ -1441,6 +1634,326 @@ class MainWindow(QMainWindow):
             QMetaObject.invokeMethod(self.progress_bar, "hide", Qt.QueuedConnection)
             QMetaObject.invokeMethod(self, "enable_inputs", Qt.QueuedConnection)
     
+    def apply_roi(self, variables, header):
+        """ROI の設定をヘッダーの格子で面の範囲に変換し、"ROI region" に設定した variables を返します"""
+        variables = dict(variables)
+        variables["ROI region"] = ga.get_roi_region(variables, header)
+        self.debug_print("apply_roi - ROI region :", variables["ROI region"])
+        return variables
+
+    def select_ovf_files(self, variables):
+        """
+        インデックスを更新し、並び順とフレームの範囲・間隔に従って処理するファイルを選択します。
+        書き込み途中のファイルはスキップします (データは読み込まずにサイズで判定)。
+
+        Returns
+        -------
+        tuple
+            (インデックスの {ファイル名: エントリ}, 処理するファイル名のリスト, スキップしたファイルのメッセージ)
+        """
+        # 書き込み中のファイルのサイズを反映するため、インデックスを更新
+        self.refresh_ovf_index(variables["Input Directory"])
+        ovf_files = self.get_ovf_index_files(variables["Input Directory"])
+
+        # 選択しなかったファイルは読み込まない
+        ovf_file_names = oi.sort_ovf_files(ovf_files, variables["File order"])
+        ovf_file_names = oi.select_frames(ovf_file_names, variables["Frame start"], variables["Frame end"], variables["Frame stride"])
+
+        if self.ovf_store is None:
+            complete_file_names = [name for name in ovf_file_names if oi.is_complete(variables["Input Directory"], name, ovf_files[name])]
+        else:
+            complete_file_names = ovf_file_names
+        skipped_count = len(ovf_file_names) - len(complete_file_names)
+        skipped_message = f" {skipped_count} incomplete files were skipped." if skipped_count else ""
+        self.debug_print("select_ovf_files - skipped files :", sorted(set(ovf_file_names) - set(complete_file_names)))
+
+        return ovf_files, complete_file_names, skipped_message
+
+    def get_unreadable_message(self, unreadable):
+        """iter_ovf_frames で読み込めずにスキップしたファイルのメッセージを返します"""
+        self.debug_print("get_unreadable_message - unreadable files :", unreadable)
+        return f" {len(unreadable)} unreadable files were skipped." if unreadable else ""
+
+    def analyze_fft(self):
+        variables = self.get_variables()
+
+        # ThreadPoolExecutorを利用して非同期処理を開始
+        self.executor = ThreadPoolExecutor(max_workers=1)  # スレッド数1
+        self.executor.submit(self.analyze_fft_task, variables)
+
+    def analyze_fft_task(self, variables):
+        """
+        選択したファイルの面・成分の時系列から FFT のパワーマップを計算し、画像と .npz に保存します。
+
+        'temporal' は各セルの時間方向の FFT から指定した周波数 (未入力の場合は平均スペクトルのピーク) の
+        パワーマップを、'spatial' は各フレームの面内 2次元 FFT の平均パワー (log10) を出力します。
+        時系列は FFT memory を超える場合は一時ファイルのメモリマップに書き込みます。
+        """
+        self.cancel_event.clear()  # 中断フラグをリセット
+        QMetaObject.invokeMethod(self, "disable_inputs", Qt.QueuedConnection)
+        QMetaObject.invokeMethod(self.progress_bar, "show", Qt.QueuedConnection)
+        QMetaObject.invokeMethod(self.progress_bar, "setValue", Q_ARG(int, 0))
+
+        time_series = None
+        try:
+            if not ga.is_scalar_format(variables["Output Format"]):
+                raise ValueError("FFT analysis requires a scalar Output Format (a component or a derived quantity).")
+
+            ovf_files, complete_file_names, skipped_message = self.select_ovf_files(variables)
+            ovf_file_path_arr = [os.path.join(variables["Input Directory"], name) for name in complete_file_names]
+            frame_count = sum(ovf_files[name]["header"].get("segment_count", 1) for name in complete_file_names)
+            if frame_count < 2:
+                raise ValueError("FFT analysis requires at least two frames.")
+            variables = self.apply_roi(variables, ovf_files[complete_file_names[0]]["header"])
+
+            # 選択した面・成分を時間優先のバッファに読み込む
+            output_directory = mi.get_output_directory(variables)
+            unreadable = []
+            for step, _, header, data in self.iter_ovf_frames(ovf_file_path_arr, variables, unreadable=unreadable):
+                if self.cancel_event.is_set():  # 中断フラグを確認
+                    raise RuntimeError("Operation canceled by the user.")
+                array, _, _ = ga.get_array(self, data, header, variables, is_plane=True)
+                if time_series is None:
+                    time_series = fa.TimeSeries(frame_count, array.shape, memory_limit=variables["FFT memory"] * 1024**2, directory=output_directory)
+                    first_header = header
+                time_series.append(array, header.get("total_simulation_time"))
+
+                progress = int((step + 1) / len(ovf_file_path_arr) * 60)
+                QMetaObject.invokeMethod(self.progress_bar, "setValue", Q_ARG(int, progress))
+            if time_series is None:
+                raise ValueError("None of the selected OVF files could be read.")
+            self.debug_print("analyze_fft_task - memmap :", time_series.is_memmap)
+
+            # FFT の結果の画像は軸の設定を上書きして描画する
+            fft_variables = dict(variables)
+            fft_variables.update({"Show Arrows": False, "Z-Axis SI prefix": "", "Z-Axis Unit": "arb.units",
+                                  "Z-Axis Displayed range min": None, "Z-Axis Displayed range max": None, "Z-Axis Tick Label": ""})
+            extension = variables["Extension"] if variables["Extension"] != "gif" else "png"
+            fft_variables["Extension"] = extension
+
+            if variables["FFT mode"] == "temporal":
+                try:
+                    dt = fa.get_sampling_interval(time_series.times[:time_series.count])
+                except ValueError as e:
+                    # スキップしたフレームがある場合は間隔が不均一になった原因として併せて表示する
+                    raise ValueError(f"{e}{skipped_message}{self.get_unreadable_message(unreadable)}") from e
+                frequencies = [frequency * 1e9 for frequency in (mi.get_tick_label(variables["FFT frequencies"]) or [])]
+                maps, map_frequencies, spectrum_frequencies, mean_spectrum = fa.compute_temporal_power(time_series.get_data(), dt, frequencies)
+                np.savez(os.path.join(output_directory, "fft_temporal.npz"), maps=maps, frequencies=map_frequencies,
+                         spectrum_frequencies=spectrum_frequencies, mean_spectrum=mean_spectrum)
+
+                fft_variables["Z-Axis Label"] = "Power"
+                for power_map, frequency in zip(maps, map_frequencies):
+                    saved_name = f"fft_temporal_{frequency / 1e9:.3f}GHz"
+                    scaled_pixmap = mi.make_image(self, power_map, fft_variables, mode="save", saved_name=saved_name, pyramid=ga.ImagePyramid(power_map))
+                    self.update_image_display(scaled_pixmap)
+                message = f"FFT power maps at {', '.join(f'{frequency / 1e9:.3f}' for frequency in map_frequencies)} GHz saved from {time_series.count} frames."
+            else:
+                x_axis, y_axis = variables["Graph X-Axis"], variables["Graph Y-Axis"]
+                power, y_wavenumbers, x_wavenumbers = fa.compute_spatial_power(time_series.get_data(), first_header[f"{y_axis}stepsize"], first_header[f"{x_axis}stepsize"])
+                np.savez(os.path.join(output_directory, "fft_spatial.npz"), power=power, kx=x_wavenumbers, ky=y_wavenumbers)
+
+                # 波数の軸 (1/μm) で描画する
+                log_power = np.log10(np.maximum(power, np.finfo(np.float64).tiny)).astype(np.float32)
+                fft_variables.update({"Z-Axis Label": "log10 Power",
+                                      "X-Axis Label": f"k_{x_axis}", "X-Axis Unit": "1/μm", "X-Axis SI prefix": "", "X-Axis Tick Label": "",
+                                      "X-Axis Overall range min": x_wavenumbers[0] * 1e-6, "X-Axis Overall range max": x_wavenumbers[-1] * 1e-6,
+                                      "X-Axis Displayed range min": None, "X-Axis Displayed range max": None,
+                                      "Y-Axis Label": f"k_{y_axis}", "Y-Axis Unit": "1/μm", "Y-Axis SI prefix": "", "Y-Axis Tick Label": "",
+                                      "Y-Axis Overall range min": y_wavenumbers[0] * 1e-6, "Y-Axis Overall range max": y_wavenumbers[-1] * 1e-6,
+                                      "Y-Axis Displayed range min": None, "Y-Axis Displayed range max": None,
+                                      "Aspect ratio width": x_wavenumbers[-1] - x_wavenumbers[0], "Aspect ratio height": y_wavenumbers[-1] - y_wavenumbers[0],
+                                      "X-Axis Reverse": False, "Y-Axis Reverse": False, "ROI region": None})
+                scaled_pixmap = mi.make_image(self, log_power, fft_variables, mode="save", saved_name="fft_spatial", pyramid=ga.ImagePyramid(log_power))
+                self.update_image_display(scaled_pixmap)
+                message = f"Spatial FFT power saved from {time_series.count} frames."
+
+            QMetaObject.invokeMethod(self.progress_bar, "setValue", Q_ARG(int, 100))
+            QMetaObject.invokeMethod(self.footer_label, "setText", Q_ARG(str, message + skipped_message + self.get_unreadable_message(unreadable)))
+
+        except Exception as e:
+            QMetaObject.invokeMethod(self.footer_label, "setText", Q_ARG(str, f"Error: {str(e)}"))
+        finally:
+            if time_series is not None:
+                time_series.close()
+            # UIリセット
+            QMetaObject.invokeMethod(self.progress_bar, "hide", Qt.QueuedConnection)
+            QMetaObject.invokeMethod(self, "enable_inputs", Qt.QueuedConnection)
+
+    def get_reference_plane(self, variables, ovf_file_names):
+        """
+        Difference の設定に従って、差分の基準の (ファイル名, 面のデータ) を返します。
+        'first frame' は選択した最初のファイル、'displayed file' は Displayed OVF File の面 (または投影) です。
+        'none' の場合は (None, None) を返します。
+        """
+        difference = variables["Difference"]
+        if difference == "none":
+            return None, None
+        reference_name = ovf_file_names[0] if difference == "first frame" else variables["Displayed OVF File"]
+
+        unused_axis = ga.get_unused_axis(variables["Graph X-Axis"], variables["Graph Y-Axis"])
+        reference, _ = self.read_ovf_plane(os.path.join(variables["Input Directory"], reference_name), unused_axis, variables["Plane index"], dtype=np.float32, projection=variables["Projection"], roi=ga.get_plane_roi(variables))
+        return reference_name, reference
+
+    def apply_series_normalization(self, variables, ovf_file_names, ovf_files, reference_name=None, reference=None):
+        """
+        選択したファイル全体の統計情報から、全フレーム共通の色の範囲を設定した variables を返します。
+
+        スカラー出力は Z-Axis Displayed range が未入力の場合に全体の範囲を、
+        ベクトル出力は "Brightness range" に全体の明るさの範囲を設定します。
+        統計情報は面のみを読み込む1パスで集計してインデックスにキャッシュし、
+        同じファイル・面の組み合わせでは再計算しません。
+        reference を指定した場合は、基準の面を引いた差分の統計を集計します。
+        差分はフレームごとに正規化すると色がちらつくため、Normalization が 'per frame' でも 'global' の範囲を使います。
+        """
+        normalization = variables["Normalization"]
+        if st.NORMALIZATIONS[normalization] is None and reference is not None:
+            normalization = "global"
+        if st.NORMALIZATIONS[normalization] is None:
+            return variables
+
+        directory = variables["Input Directory"]
+        unused_axis = ga.get_unused_axis(variables["Graph X-Axis"], variables["Graph Y-Axis"])
+        plane_index = variables["Plane index"]
+
+        if variables["Projection"] != "plane":
+            plane_index = variables["Projection"]
+        is_derived = dq.is_derived_format(variables["Output Format"])
+        if is_derived:
+            plane_index = f"{plane_index}:{variables['Output Format']}"
+        key_files = [(name, ovf_files[name]["size"], ovf_files[name]["mtime"]) for name in ovf_file_names]
+        plane_roi = ga.get_plane_roi(variables)
+        if plane_roi is not None:
+            plane_index = f"{plane_index}:roi{plane_roi}"
+        if reference is not None:
+            plane_index = f"{plane_index}:difference"
+            key_files.append((reference_name, ovf_files[reference_name]["size"], ovf_files[reference_name]["mtime"]))
+        key = st.get_stats_key(unused_axis, plane_index, key_files)
+        stats = oi.load_stats(directory, key)
+        if stats is None:
+            QMetaObject.invokeMethod(self.footer_label, "setText", Q_ARG(str, "Computing statistics of the selected files..."))
+            ovf_file_path_arr = [os.path.join(directory, name) for name in ovf_file_names]
+            if is_derived:
+                # 派生量は1成分の面として集計する
+                planes = (dq.compute_derived_quantity(data, header, unused_axis, variables["Output Format"])[..., np.newaxis] for _, _, header, data in self.iter_ovf_frames(ovf_file_path_arr, variables, reference))
+            else:
+                planes = (data for _, _, _, data in self.iter_ovf_frames(ovf_file_path_arr, variables, reference))
+            stats = st.compute_series_stats(planes)
+            oi.save_stats(directory, key, stats)
+        self.debug_print("apply_series_normalization - stats :", stats)
+
+        variables = dict(variables)
+        vector_index = 0 if is_derived else ga.get_vector_index(variables["Output Format"], len(stats["components"]))
+        if vector_index != 3:
+            vmin, vmax = st.get_value_range(stats, vector_index, normalization)
+            # カラーバーを表示する場合、画像の値は Z-Axis SI prefix で割られる
+            multiplier = mi.get_multiplier(variables["Z-Axis SI prefix"]) if variables["Show Colorbar"] else 1
+            if variables["Z-Axis Displayed range min"] is None and vmin is not None:
+                variables["Z-Axis Displayed range min"] = vmin / multiplier
+            if variables["Z-Axis Displayed range max"] is None and vmax is not None:
+                variables["Z-Axis Displayed range max"] = vmax / multiplier
+        else:
+            idx_dict = {"x": 0, "y": 1, "z": 2}
+            variables["Brightness range"] = st.get_brightness_range(stats, idx_dict[unused_axis], normalization)
+
+        return variables
+
+    def iter_ovf_frames(self, ovf_file_path_arr, variables, reference=None, unreadable=None):
+        """
+        OVF ファイルの各セグメントを1フレームとして、(ファイル番号, 保存名, ヘッダー, 面のデータ) を順に返します。
+        複数セグメントのファイルは保存名にセグメント番号を付加します。
+        現在のフレームを描画している間、次のファイルをバックグラウンドで先読みします。
+        複数セグメントのファイルは先読みせず、描画しながら1セグメントずつ読み込みます。
+        reference (基準の面) を指定した場合は、各フレームの面から in-place で引いて返します。
+        読み込めなかったファイル (サイズで判定できない圧縮ファイルの書き込み途中など) はスキップし、
+        unreadable (リスト) を指定した場合はそのファイル名を追加します。
+        """
+        unused_axis = ga.get_unused_axis(variables["Graph X-Axis"], variables["Graph Y-Axis"])
+        plane_index = variables["Plane index"]
+        ovf_files = self.get_ovf_index_files(variables["Input Directory"])
+        headers = {os.path.join(variables["Input Directory"], name): entry["header"] for name, entry in ovf_files.items()}
+        roi = ga.get_plane_roi(variables)
+
+        def segment_count(ovf_file_path):
+            return (headers.get(ovf_file_path) or {}).get("segment_count", 1)
+
+        def load(ovf_file_path):
+            planes = self.iter_ovf_planes(ovf_file_path, unused_axis, plane_index, dtype=np.float32, projection=variables["Projection"], roi=roi)
+            if segment_count(ovf_file_path) > 1:
+                # 時系列全体を含むファイルを先読みで一度に保持しないよう、ジェネレーターのまま返す
+                return planes
+            try:
+                return list(planes)
+            except rof.READ_ERRORS as e:
+                self.debug_print("iter_ovf_frames - unreadable file :", ovf_file_path, e)
+                return None
+
+        def iter_segments(ovf_file_path, planes):
+            # 複数セグメントのファイルは途中のセグメントで読み込めなくなった場合も残りをスキップする
+            try:
+                yield from planes
+            except rof.READ_ERRORS as e:
+                self.debug_print("iter_ovf_frames - unreadable file :", ovf_file_path, e)
+                if unreadable is not None:
+                    unreadable.append(os.path.basename(ovf_file_path))
+
+        def plane_size(ovf_file_path):
+            # インデックスのヘッダーから面のデータサイズを見積もる (先読みしない複数セグメントのファイルは 0)
+            header = headers.get(ovf_file_path) or {}
+            if not header or segment_count(ovf_file_path) > 1:
+                return 0
+            if roi is not None:
+                n_cells = (roi[0][1] - roi[0][0]) * (roi[1][1] - roi[1][0])
+            else:
+                n_cells = header["xnodes"] * header["ynodes"] * header["znodes"] // header[unused_axis + "nodes"]
+            return n_cells * header["valuedim"] * np.dtype(np.float32).itemsize
+
+        planes_arr = ol.prefetch(ovf_file_path_arr, load, depth=variables["Prefetch depth"], memory_limit=variables["Prefetch memory"] * 1024**2, item_size=plane_size, cancel_event=self.cancel_event)
+
+        for step, (ovf_file_path, planes) in enumerate(zip(ovf_file_path_arr, planes_arr)):
+            if planes is None:
+                if unreadable is not None:
+                    unreadable.append(os.path.basename(ovf_file_path))
+                continue
+            base_name = rof.strip_ovf_extension(os.path.basename(ovf_file_path))
+            for header, data in iter_segments(ovf_file_path, planes):
+                if header.get("segment_count", 1) > 1:
+                    saved_name = f"{base_name}_{header['segment_index']:04d}"
+                else:
+                    saved_name = base_name
+                if reference is not None:
+                    if data.shape != reference.shape:
+                        raise ValueError(f"The shape of {os.path.basename(ovf_file_path)} does not match the reference frame.")
+                    np.subtract(data, reference, out=data)
+                yield step, saved_name, header, data
+
+        if self.cancel_event.is_set():
+            raise RuntimeError("Operation canceled by the user.")
+
+    def read_ovf_plane(self, ovf_file_path, unused_axis, plane_index, dtype=None, projection="plane", roi=None):
+        """
+        入力がストアファイルの場合はストアから、それ以外は OVF ファイルから1面を読み込みます。
+        projection が "plane" 以外の場合は、plane_index の面の代わりに unused_axis 方向の投影を読み込みます。
+        roi (ga.get_plane_roi の戻り値) を指定した場合は ROI の範囲のみを読み込みます。
+        """
+        if self.ovf_store is not None:
+            if projection != "plane":
+                return self.ovf_store.read_ovf_projection(os.path.basename(ovf_file_path), unused_axis, projection, dtype, roi=roi)
+            return self.ovf_store.read_ovf_plane(os.path.basename(ovf_file_path), unused_axis, plane_index, dtype, roi=roi)
+        if projection != "plane":
+            return rof.read_ovf_projection(ovf_file_path, unused_axis, projection, dtype, roi=roi)
+        return rof.read_ovf_plane(ovf_file_path, unused_axis, plane_index, dtype, roi=roi)
+
+    def iter_ovf_planes(self, ovf_file_path, unused_axis, plane_index, dtype=None, projection="plane", roi=None):
+        """入力がストアファイルの場合はストアから、それ以外は OVF ファイルから各セグメントの1面 (または投影) を読み込みます"""
+        if self.ovf_store is not None:
+            if projection != "plane":
+                return self.ovf_store.iter_ovf_projections(os.path.basename(ovf_file_path), unused_axis, projection, dtype, roi=roi)
+            return self.ovf_store.iter_ovf_planes(os.path.basename(ovf_file_path), unused_axis, plane_index, dtype, roi=roi)
+        if projection != "plane":
+            return rof.iter_ovf_projections(ovf_file_path, unused_axis, projection, dtype, roi=roi)
+        return rof.iter_ovf_planes(ovf_file_path, unused_axis, plane_index, dtype, roi=roi)
+
     def debug_print(self, *args):
         if self.is_debug:
             print(*args)
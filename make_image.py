@@ -12,6 +12,9 @@ from PIL import Image
 import matplotlib
 matplotlib.use('Agg')
 
+# Output formats that embed the image at full resolution instead of a pyramid level
+VECTOR_EXTENSIONS = ("svg", "eps", "pdf")
+
 def gen_cmap_rgb(cols):
     nmax = float(len(cols)-1)
     cdict = {'red':[], 'green':[], 'blue':[]}
@@ -167,25 +170,80 @@ def get_tick_label(tick_label):
     except Exception:
         return None
 
-def make_image(self, array, variables, mode="check", saved_name="", arrow_azimuthal_angle_array=None, arrow_magnitude_xy_array=None):
-    is_show_axis = variables["Show Axis"]
-    is_show_cbar = variables["Show Colorbar"]
-    is_colorbar_bottom = variables["Colorbar Bottom"]
+def get_output_directory(variables):
+    # Save next to the store file when the input is a store file instead of a directory
+    input_path = variables["Input Directory"]
+    if os.path.isfile(input_path):
+        return os.path.dirname(input_path)
+    return input_path
+
+
+def get_target_shape(self, fig, ax, mode, variables):
+    """
+    Return the (rows, cols) device pixels covered by ax in the final image, or None when full resolution is needed.
+
+    Previews are drawn at the figure dpi and shrunk to the QLabel, animation frames and raster files are drawn at the
+    export dpi. Vector files keep the full-resolution image so they can be zoomed.
+    """
+    fig_w_inch, fig_h_inch = fig.get_size_inches()
+    # Before the first draw ax.get_position() is still the (0, 0, 1, 1) box passed to add_axes, so resolve the
+    # Divider locator (fixed sizes only, no renderer needed) to get the final axes bounds
+    locator = ax.get_axes_locator()
+    bbox = locator(ax, None) if locator is not None else ax.get_position()
+
+    if mode == "check":
+        dpi = fig.dpi
+        label_scale = min(self.graph_display.width() / (fig_w_inch * dpi), self.graph_display.height() / (fig_h_inch * dpi), 1)
+        dpi *= label_scale
+    elif mode == "save" and variables["Extension"].lower() in VECTOR_EXTENSIONS:
+        return None
+    else:
+        dpi = variables["dpi"]
 
-    is_x_axis_reverse = variables["X-Axis Reverse"]
-    is_y_axis_reverse = variables["Y-Axis Reverse"]
+    return int(np.ceil(bbox.height * fig_h_inch * dpi)), int(np.ceil(bbox.width * fig_w_inch * dpi))
 
-    if is_x_axis_reverse:
+def get_display_array(array, variables):
+    """Apply the axis reversal and colorbar prefix scaling to the array passed to imshow."""
+    if variables["X-Axis Reverse"]:
         array = np.flip(array, axis=1)
-    if is_y_axis_reverse:
+    if variables["Y-Axis Reverse"]:
         array = np.flip(array, axis=0)
 
+    # Only scalar data is scaled by the colorbar prefix (RGB colors may be uint8)
+    if variables["Show Colorbar"] and array.ndim == 2:
+        array = array / get_multiplier(variables["Z-Axis SI prefix"])
+    return array
+
+
+def make_image(self, array, variables, mode="check", saved_name="", arrow_azimuthal_angle_array=None, arrow_magnitude_xy_array=None, pyramid=None):
+    # With an ImagePyramid, array is its full-resolution level: the extent, ticks and arrows follow
+    # the full-resolution shape while imshow draws the coarsest level that still covers the output pixels
+    if pyramid is not None:
+        array = pyramid.get_level()
+
+    is_show_axis = variables["Show Axis"]
+    is_show_cbar = variables["Show Colorbar"]
+    is_colorbar_bottom = variables["Colorbar Bottom"]
+
     x_multiplier = get_multiplier(variables["X-Axis SI prefix"])
     y_multiplier = get_multiplier(variables["Y-Axis SI prefix"])
     
     Sizex = variables["Size" + variables["Graph X-Axis"]] if variables["Size" + variables["Graph X-Axis"]] is None else variables["Size" + variables["Graph X-Axis"]] / x_multiplier
     Sizey = variables["Size" + variables["Graph Y-Axis"]] if variables["Size" + variables["Graph Y-Axis"]] is None else variables["Size" + variables["Graph Y-Axis"]] / y_multiplier
 
+    # With an ROI the array holds rows/cols of the full plane, so sizes and extents are scaled to the cropped part
+    roi_region = variables.get("ROI region")
+    if roi_region is None:
+        (row_start, row_stop), (col_start, col_stop) = (0, array.shape[0]), (0, array.shape[1])
+        full_rows, full_cols = array.shape[:2]
+    else:
+        (row_start, row_stop), (col_start, col_stop) = roi_region["rows"], roi_region["cols"]
+        full_rows, full_cols = roi_region["shape"]
+    if Sizex is not None:
+        Sizex = Sizex * (col_stop - col_start) / full_cols
+    if Sizey is not None:
+        Sizey = Sizey * (row_stop - row_start) / full_rows
+
     aspect_ratio_width = variables["Aspect ratio width"]
     aspect_ratio_height = variables["Aspect ratio height"]
     if None in (aspect_ratio_width, aspect_ratio_height):
@@ -199,7 +257,7 @@ def make_image(self, array, variables, mode="check", saved_name="", arrow_azimut
     vmin = variables["Z-Axis Displayed range min"]
     vmax = variables["Z-Axis Displayed range max"]
 
-    extent = (0, array.shape[1]-1) + (0, array.shape[0]-1)
+    extent = (col_start, col_stop-1) + (row_start, row_stop-1)
     is_xaxis_range = False
     is_yaxis_range = False
 
@@ -211,15 +269,17 @@ def make_image(self, array, variables, mode="check", saved_name="", arrow_azimut
 
     if is_show_axis:
         if None in x_overall_range:
-            x_range = (0, array.shape[1]-1)
+            x_range = (col_start, col_stop-1)
         else:
-            x_range = x_overall_range
+            x_span = x_overall_range[1] - x_overall_range[0]
+            x_range = (x_overall_range[0] + x_span * col_start / full_cols, x_overall_range[0] + x_span * col_stop / full_cols)
             is_xaxis_range = True
         
         if None in y_overall_range:
-            y_range = (0, array.shape[0]-1)
+            y_range = (row_start, row_stop-1)
         else:
-            y_range = y_overall_range
+            y_span = y_overall_range[1] - y_overall_range[0]
+            y_range = (y_overall_range[0] + y_span * row_start / full_rows, y_overall_range[0] + y_span * row_stop / full_rows)
             is_yaxis_range = True
 
         extent = x_range + y_range
@@ -236,9 +296,6 @@ def make_image(self, array, variables, mode="check", saved_name="", arrow_azimut
     else:
         ax_margin_inch = (0, 0, 0, 0)    # Left,Top,Right,Bottom [inch]
     
-    if is_show_cbar:
-        array /= get_multiplier(variables["Z-Axis SI prefix"])
-    
     cbar_width_inch = variables["Colorbar Width"] if is_show_cbar else 0
     graph_cbar_distance_inch = variables["Between Graph and Colorbar"]  if is_show_cbar else 0
 
@@ -246,11 +303,26 @@ def make_image(self, array, variables, mode="check", saved_name="", arrow_azimut
     
     plt, fig, ax, cax = figure_size_setting(aspect, ax_margin_inch, cbar_width_inch, graph_cbar_distance_inch, is_show_cbar, is_show_axis, graph_font_size, is_colorbar_bottom)
 
+    if pyramid is not None:
+        image = pyramid.get_level(get_target_shape(self, fig, ax, mode, variables))
+    else:
+        image = array
+    image = get_display_array(image, variables)
+
+    if pyramid is not None and image.ndim == 2 and (vmin is None or vmax is None):
+        # Autoscale from the full-resolution data, since a downsampled level would shrink the range with the dpi
+        data_min, data_max = pyramid.get_value_range()
+        multiplier = get_multiplier(variables["Z-Axis SI prefix"]) if variables["Show Colorbar"] else 1
+        if vmin is None and data_min is not None:
+            vmin = data_min / multiplier
+        if vmax is None and data_max is not None:
+            vmax = data_max / multiplier
+
     cmap = get_colormap(variables)
-    if array.ndim == 2:
-        im = ax.imshow(array, origin='lower', extent=extent, cmap=cmap, aspect="auto", vmin=vmin, vmax=vmax)
-    elif array.ndim == 3:
-        im = ax.imshow(array, origin='lower', extent=extent, aspect="auto")
+    if image.ndim == 2:
+        im = ax.imshow(image, origin='lower', extent=extent, cmap=cmap, aspect="auto", vmin=vmin, vmax=vmax)
+    elif image.ndim == 3:
+        im = ax.imshow(image, origin='lower', extent=extent, aspect="auto")
     
     if is_show_axis:
         x_label = variables["X-Axis Label"] + " (" + variables["X-Axis SI prefix"] + variables["X-Axis Unit"] + ")"
@@ -361,7 +433,7 @@ def make_image(self, array, variables, mode="check", saved_name="", arrow_azimut
 
     if mode == "save":
         output_file_name = saved_name + '.' + variables["Extension"]
-        output_file_path = os.path.join(variables["Input Directory"], output_file_name)
+        output_file_path = os.path.join(get_output_directory(variables), output_file_name)
         
         # plt.tight_layout()
         plt.savefig(output_file_path, transparent=True, dpi=saved_dpi, bbox_inches='tight')
@@ -404,8 +476,11 @@ def make_image(self, array, variables, mode="check", saved_name="", arrow_azimut
 
 
 def create_gif(self, frames, variables):
-    output_file_name = os.path.basename(variables["Input Directory"]) + ".gif"
-    output_file_path = os.path.join(variables["Input Directory"], output_file_name)
+    output_file_name = os.path.basename(os.path.normpath(variables["Input Directory"]))
+    if os.path.isfile(variables["Input Directory"]):
+        output_file_name = os.path.splitext(output_file_name)[0]
+    output_file_name += ".gif"
+    output_file_path = os.path.join(get_output_directory(variables), output_file_name)
     speed = variables["GIF animation speed"]  # デフォルト速度: 100ms
 
     pil_images = []
@@ -0,0 +1,193 @@
+import os
+import re
+import json
+
+import read_ovf_files as rof
+
+# ディレクトリごとに保存するインデックスファイルの名前
+INDEX_FILE_NAME = ".ovf_index.json"
+
+# インデックスファイルの形式のバージョン (形式を変更した場合は更新する)
+INDEX_VERSION = 1
+
+# インデックスに保存する統計情報 (ovf_stats) の最大数 (超えた場合は古いものから削除)
+MAX_STATS_ENTRIES = 16
+
+# ファイルの並び順 ('name': ファイル名の自然順, 'simulation time': ヘッダーのシミュレーション時間順)
+FILE_ORDERS = ("name", "simulation time")
+
+# ファイル名の数字部分
+NUMBER_PATTERN = re.compile(r'(\d+)')
+
+
+def get_index_path(directory):
+    """
+    ディレクトリのインデックスファイルのパスを返します。
+    アーカイブの場合はアーカイブと同じ場所の '.<アーカイブ名>.ovf_index.json' です。
+    """
+    if rof.is_archive_file(directory):
+        parent, name = os.path.split(directory)
+        return os.path.join(parent, "." + name + INDEX_FILE_NAME)
+    return os.path.join(directory, INDEX_FILE_NAME)
+
+
+def load_index(directory):
+    """
+    ディレクトリのインデックスファイルを読み込みます。
+
+    ファイルが無い場合や形式が異なる場合は空のインデックスを返します。
+    """
+    try:
+        with open(get_index_path(directory), 'r') as file:
+            index = json.load(file)
+        if index.get("version") == INDEX_VERSION:
+            return index
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    return {"version": INDEX_VERSION, "files": {}}
+
+
+def save_index(directory, index):
+    """
+    インデックスをディレクトリに保存します。
+
+    一時ファイルに書き込んでから置き換えるため、書き込み途中のファイルが
+    残ることはありません。ディレクトリに書き込めない場合は何もしません。
+    """
+    index_path = get_index_path(directory)
+    tmp_path = index_path + ".tmp"
+    try:
+        with open(tmp_path, 'w') as file:
+            json.dump(index, file)
+        os.replace(tmp_path, index_path)
+    except OSError:
+        pass
+
+
+def scan_ovf_files(directory):
+    """
+    ディレクトリ内の OVF ファイル (圧縮ファイルを含む) の (ファイル名, サイズ, 更新時刻) を列挙します。
+    アーカイブの場合は展開せずに、アーカイブのメンバー一覧から列挙します。
+    """
+    if rof.is_archive_file(directory):
+        yield from rof.list_archive_members(directory)
+        return
+
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if rof.is_ovf_file(entry.name) and entry.is_file():
+                stat = entry.stat()
+                yield entry.name, stat.st_size, stat.st_mtime_ns
+
+
+def update_index(directory):
+    """
+    ディレクトリのインデックスを更新して返します。
+
+    各 OVF ファイルのサイズと更新時刻をインデックスと比較し、新規または
+    変更されたファイルのヘッダーのみを読み込みます。削除されたファイルは
+    インデックスから除外し、変更があった場合のみインデックスファイルを保存します。
+
+    Parameters
+    ----------
+    directory : str
+        OVF ファイルを含むディレクトリ、または OVF ファイルを含むアーカイブ (.zip / .tar)
+
+    Returns
+    -------
+    dict
+        {"version": ..., "files": {ファイル名: {"size": ..., "mtime": ..., "header": ...}}}
+        "files" はファイル名の自然順に並びます。
+        ヘッダーを読み込めなかったファイルの "header" は None になります。
+    """
+    index = load_index(directory)
+    old_files = index["files"]
+    files = {}
+    is_changed = False
+
+    for name, size, mtime in sorted(scan_ovf_files(directory), key=lambda item: natural_sort_key(item[0])):
+        entry = old_files.get(name)
+        if entry is None or entry["size"] != size or entry["mtime"] != mtime:
+            try:
+                header = rof.read_ovf_file(os.path.join(directory, name), output_mode='headers')
+            except (OSError, ValueError):
+                header = None
+            entry = {"size": size, "mtime": mtime, "header": header}
+            is_changed = True
+        files[name] = entry
+
+    if is_changed or len(files) != len(old_files):
+        index["files"] = files
+        save_index(directory, index)
+
+    return index
+
+
+def natural_sort_key(name):
+    """ファイル名の数字部分を数値として比較するソートキーを返します ('m10.ovf' < 'm100.ovf')"""
+    parts = NUMBER_PATTERN.split(name)
+    return [int(part) if i % 2 else part.lower() for i, part in enumerate(parts)], name
+
+
+def sort_ovf_files(files, order="name"):
+    """
+    インデックスの {ファイル名: エントリ} のファイル名を order の順に並べたリストを返します。
+
+    order が 'simulation time' の場合はヘッダーの 'total_simulation_time' の順に並べ、
+    時間が不明なファイルは自然順で末尾に並べます。
+    """
+    if order == "name":
+        return sorted(files, key=natural_sort_key)
+    if order == "simulation time":
+        def time_key(name):
+            header = files[name]["header"] or {}
+            time = header.get("total_simulation_time")
+            return time is None, time or 0., natural_sort_key(name)
+        return sorted(files, key=time_key)
+    raise ValueError(f"Unsupported file order: {order}")
+
+
+def select_frames(names, start=0, end=None, stride=1):
+    """
+    並べたファイル名のリストから start 番目から end 番目まで (end を含む) のファイルを stride ごとに選択します。
+
+    end が None の場合は最後のファイルまでです (ROI の範囲と同じく両端を含みます)。
+    スライスで選択するだけなので、選択されなかったファイルは読み込まれません。
+    """
+    if stride < 1:
+        raise ValueError("Frame stride must be 1 or more.")
+    return names[start:None if end is None else end + 1:stride]
+
+
+def is_complete(directory, name, entry):
+    """
+    インデックスのエントリから、ファイルが最後まで書き込まれているかを返します。
+
+    バイナリ形式のファイルはインデックスのサイズとヘッダーを比較するだけで、ファイルを開きません。
+    ヘッダーを読み込めなかったファイル (書き込み途中など) は False です。
+    """
+    if entry["header"] is None:
+        return False
+    return rof.validate_ovf_file(os.path.join(directory, name), entry["header"], entry["size"])
+
+
+def load_stats(directory, key):
+    """インデックスにキャッシュした統計情報 (ovf_stats.compute_series_stats の戻り値) を返します (無い場合は None)"""
+    return load_index(directory).get("stats", {}).get(key)
+
+
+def save_stats(directory, key, stats):
+    """
+    統計情報をインデックスに保存します。
+
+    キーは ovf_stats.get_stats_key で作成します。MAX_STATS_ENTRIES を超えた場合は
+    古い統計情報から削除します。
+    """
+    index = load_index(directory)
+    entries = index.setdefault("stats", {})
+    entries.pop(key, None)
+    entries[key] = stats
+    while len(entries) > MAX_STATS_ENTRIES:
+        entries.pop(next(iter(entries)))
+    save_index(directory, index)
@@ -0,0 +1,156 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import numpy as np
+
+import read_ovf_files as rof
+import ovf_index as oi
+
+# キャンセルを確認する間隔 (秒)
+CANCEL_POLL_INTERVAL = 0.1
+
+
+def prefetch(items, load, depth=2, memory_limit=None, item_size=None, cancel_event=None):
+    """
+    items の各要素に対して load(item) を実行し、その結果を items の順に返すジェネレーターです。
+
+    呼び出し側が現在の結果を処理している間に、次の最大 depth 個の要素を
+    バックグラウンドのスレッドで先読みします (読み込みと描画の重ね合わせ)。
+
+    Parameters
+    ----------
+    items : iterable
+        読み込む要素 (ファイルパスなど)
+    load : callable
+        要素を読み込む関数
+    depth : int, optional
+        先読みする要素数の上限。デフォルトは 2。
+    memory_limit : int, optional
+        先読み中の結果の合計サイズ (バイト) の上限。item_size と併せて指定します。
+        上限を超える場合でも、少なくとも1つは読み込みます。
+    item_size : callable, optional
+        要素の読み込み結果のおおよそのサイズ (バイト) を返す関数
+    cancel_event : threading.Event, optional
+        セットされた場合、未開始の読み込みを取り消して終了します。
+        (呼び出し側で cancel_event を確認して中断を判定してください)
+
+    Yields
+    ------
+    object
+        load(item) の結果
+    """
+    items = list(items)
+    depth = max(1, depth)
+    executor = ThreadPoolExecutor(max_workers=depth)
+    pending = deque()  # (future, size)
+    pending_size = 0
+    next_index = 0
+
+    try:
+        while next_index < len(items) or pending:
+            # 先読みの上限 (要素数・メモリ) まで読み込みを開始
+            while next_index < len(items) and len(pending) < depth:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                size = item_size(items[next_index]) if item_size is not None else 0
+                if pending and memory_limit is not None and pending_size + size > memory_limit:
+                    break
+                pending.append((executor.submit(load, items[next_index]), size))
+                pending_size += size
+                next_index += 1
+
+            future, size = pending.popleft()
+            pending_size -= size
+
+            # 読み込み完了を待つ間もキャンセルを確認する
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                try:
+                    result = future.result(timeout=CANCEL_POLL_INTERVAL)
+                    break
+                except TimeoutError:
+                    continue
+
+            yield result
+    finally:
+        for future, _ in pending:
+            future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def list_ovf_paths(source):
+    """ディレクトリ、またはファイルパスのリストから OVF ファイルのパスのリストを返します"""
+    if isinstance(source, (str, os.PathLike)):
+        directory = os.fspath(source)
+        return [os.path.join(directory, name) for name in oi.update_index(directory)["files"]]
+    return [os.fspath(path) for path in source]
+
+
+def load_ovf_stack(source, dtype=np.float32, unused_axis=None, plane_index=None, max_workers=None):
+    """
+    複数の OVF ファイルを並列に読み込み、時系列の1つの配列にまとめます。
+
+    最初のファイルのヘッダーから形状を決めて出力配列を一度だけ確保し、
+    各ワーカースレッドは自分の担当するスロット stack[i] に直接読み込みます
+    (ファイルごとの中間配列は作りません)。複数セグメントのファイルは
+    最初のセグメントのみを読み込みます。
+
+    Parameters
+    ----------
+    source : str or list of str
+        OVF ファイルを含むディレクトリ、または OVF ファイルのパスのリスト
+    dtype : numpy.dtype, optional
+        出力配列の dtype。デフォルトは float32。
+    unused_axis : str, optional
+        指定した場合、この軸に垂直な1面のみを読み込みます ('x', 'y' または 'z')。
+    plane_index : int, optional
+        unused_axis を指定した場合の面のインデックス
+    max_workers : int, optional
+        読み込みに使うスレッド数の上限。None の場合は ThreadPoolExecutor の既定値。
+
+    Returns
+    -------
+    tuple
+        (stack, headers_list, stats) のタプル。
+        stack の形状は (n_files, znodes, ynodes, xnodes, valuedim)、
+        unused_axis を指定した場合は (n_files, 面の形状...) です。
+        stats は {"files": ファイル数, "seconds": 所要時間, "files_per_s": ..., "mb_per_s": ...}
+        で、mb_per_s は読み込んだ (デコード後の) データ量を基準にした値です。
+    """
+    ovf_file_path_arr = list_ovf_paths(source)
+    if not ovf_file_path_arr:
+        raise ValueError("No OVF files found.")
+
+    # 最初のファイルのヘッダーから出力配列の形状を決定
+    first_header = rof.read_ovf_file(ovf_file_path_arr[0], output_mode='headers')
+    if unused_axis is None:
+        shape = (first_header['znodes'], first_header['ynodes'], first_header['xnodes'], first_header['valuedim'])
+    else:
+        rof.check_plane_index(first_header, unused_axis, plane_index)
+        shape = rof.get_plane_shape(first_header, unused_axis)
+
+    stack = np.empty((len(ovf_file_path_arr),) + shape, dtype=dtype)
+
+    def load(index):
+        if unused_axis is None:
+            _, header = rof.read_ovf_file(ovf_file_path_arr[index], output_mode='both', out=stack[index])
+        else:
+            _, header = rof.read_ovf_plane(ovf_file_path_arr[index], unused_axis, plane_index, out=stack[index])
+        return header
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        headers_list = list(executor.map(load, range(len(ovf_file_path_arr))))
+    seconds = time.perf_counter() - start_time
+
+    stats = {
+        "files": len(ovf_file_path_arr),
+        "seconds": seconds,
+        "files_per_s": len(ovf_file_path_arr) / seconds if seconds > 0 else float('inf'),
+        "mb_per_s": stack.nbytes / 1024**2 / seconds if seconds > 0 else float('inf'),
+    }
+
+    return stack, headers_list, stats
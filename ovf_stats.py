@@ -0,0 +1,211 @@
+import json
+import hashlib
+
+import numpy as np
+
+# ヒストグラムのビン数 (偶数。範囲を広げる際に隣り合う2ビンを1つにまとめる)
+HISTOGRAM_BINS = 4096
+
+# 統計情報に保存するパーセンタイル (%)
+PERCENTILES = (0.5, 1, 5, 50, 95, 99, 99.5)
+
+# 色の範囲の正規化方法 (名前: 使う統計量)。'per frame' はフレームごとの最小値・最大値 (従来の動作)
+NORMALIZATIONS = {
+    "per frame": None,
+    "global": ("min", "max"),
+    "global (1-99%)": ("1", "99"),
+}
+
+
+class StreamingHistogram:
+    """
+    ビン数を固定したまま、値の範囲に合わせてビン幅を広げるヒストグラムです。
+
+    値が現在の範囲の外にある場合は、隣り合う2ビンをまとめてビン幅を2倍にし、
+    範囲を外側の方向に2倍に広げます (全データを保持せずに1パスで集計できます)。
+    """
+
+    def __init__(self, bins=HISTOGRAM_BINS):
+        self.bins = bins
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.low = None  # 範囲の下限
+        self.width = None  # ビン幅
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def high(self):
+        """範囲の上限"""
+        return self.low + self.bins * self.width
+
+    def add(self, values):
+        """値を追加します (NaN と無限大は無視します)"""
+        values = np.asarray(values).ravel()
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            return
+
+        value_min = float(values.min())
+        value_max = float(values.max())
+        self.min = min(self.min, value_min)
+        self.max = max(self.max, value_max)
+
+        if self.low is None:
+            span = value_max - value_min
+            if span == 0:
+                span = max(abs(value_min), 1.0) * 1e-6
+            self.low = value_min
+            self.width = span / self.bins
+
+        # 範囲外の値がある場合はビン幅を2倍にして範囲を広げる
+        while value_min < self.low or value_max > self.high:
+            merged = self.counts.reshape(-1, 2).sum(axis=1)
+            self.counts = np.zeros(self.bins, dtype=np.int64)
+            if value_min < self.low:
+                self.counts[self.bins // 2:] = merged
+                self.low -= self.bins * self.width
+            else:
+                self.counts[:self.bins // 2] = merged
+            self.width *= 2
+
+        index = ((values - self.low) / self.width).astype(np.intp)
+        np.minimum(index, self.bins - 1, out=index)
+        self.counts += np.bincount(index, minlength=self.bins)
+
+    def percentile(self, q):
+        """q パーセンタイル (%) をビン内の線形補間で求めます (データが無い場合は None)"""
+        total = self.counts.sum()
+        if total == 0:
+            return None
+
+        cumulative = np.cumsum(self.counts)
+        target = q / 100 * total
+        index = min(int(np.searchsorted(cumulative, target)), self.bins - 1)
+        previous = cumulative[index - 1] if index > 0 else 0
+        fraction = (target - previous) / self.counts[index] if self.counts[index] else 0.
+        value = self.low + (index + fraction) * self.width
+        return float(min(max(value, self.min), self.max))
+
+    def to_dict(self):
+        """{"min", "max", "percentiles"} の辞書を返します (JSON に保存できる形式)"""
+        if self.low is None:
+            return {"min": None, "max": None, "percentiles": {}}
+        return {
+            "min": self.min,
+            "max": self.max,
+            "percentiles": {f"{q:g}": self.percentile(q) for q in PERCENTILES},
+        }
+
+
+def compute_series_stats(planes, bins=HISTOGRAM_BINS):
+    """
+    時系列の面のデータを1パスで集計し、全フレーム共通の統計情報を返します。
+
+    各成分の最小値・最大値・パーセンタイルに加えて、3成分のベクトルの場合は
+    各軸の方向余弦 (成分 / 大きさ) の統計も集計します。get_rgb_colormap の明るさは
+    極軸の方向余弦の単調関数なので、任意の面・軸の組み合わせの明るさの範囲を求められます。
+    メモリ上に保持するのは現在の面とヒストグラムのみです。
+
+    Parameters
+    ----------
+    planes : iterable of numpy.ndarray
+        (..., valuedim) の形状の面のデータ (read_ovf_plane の戻り値など)
+    bins : int, optional
+        ヒストグラムのビン数
+
+    Returns
+    -------
+    dict
+        {"frames": フレーム数, "components": [成分ごとの統計], "polar_cos": [軸ごとの方向余弦の統計]}
+        各統計は StreamingHistogram.to_dict の形式です。
+        "polar_cos" は 3成分のベクトルの場合のみ含まれます。
+    """
+    frames = 0
+    component_histograms = None
+    cos_histograms = None
+
+    for plane in planes:
+        valuedim = plane.shape[-1]
+        if component_histograms is None:
+            component_histograms = [StreamingHistogram(bins) for _ in range(valuedim)]
+            cos_histograms = [StreamingHistogram(bins) for _ in range(valuedim)] if valuedim == 3 else []
+        elif len(component_histograms) != valuedim:
+            raise ValueError("All frames must have the same number of components.")
+
+        for component, histogram in enumerate(component_histograms):
+            histogram.add(plane[..., component])
+
+        if cos_histograms:
+            magnitude = np.sqrt(np.sum(np.square(plane, dtype=np.float32), axis=-1))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                for component, histogram in enumerate(cos_histograms):
+                    histogram.add(plane[..., component] / magnitude)
+
+        frames += 1
+
+    if component_histograms is None:
+        raise ValueError("No frames to compute statistics.")
+
+    stats = {"frames": frames, "components": [histogram.to_dict() for histogram in component_histograms]}
+    if cos_histograms:
+        stats["polar_cos"] = [histogram.to_dict() for histogram in cos_histograms]
+    return stats
+
+
+def get_stats_key(unused_axis, plane_index, files):
+    """
+    統計情報をインデックスにキャッシュする際のキーを返します。
+
+    キーには面の指定と、対象ファイルの (ファイル名, サイズ, 更新時刻) のハッシュを含むため、
+    ファイルの追加・変更・選択範囲の変更があると別のキーになります。
+
+    Parameters
+    ----------
+    files : list of tuple
+        対象ファイルの (ファイル名, サイズ, 更新時刻) のリスト (順序を含めて比較します)
+    """
+    digest = hashlib.sha1(json.dumps(files).encode("utf-8")).hexdigest()
+    return f"{unused_axis}{plane_index}:{digest}"
+
+
+def get_value_range(stats, component, normalization):
+    """
+    成分 component の全フレーム共通の表示範囲 (vmin, vmax) を返します。
+
+    normalization が 'per frame' の場合や統計が無い場合は (None, None) を返します。
+    """
+    keys = NORMALIZATIONS[normalization]
+    if keys is None:
+        return None, None
+    return get_stat_pair(stats["components"][component], keys)
+
+
+def get_brightness_range(stats, polar_component, normalization):
+    """
+    get_rgb_colormap の明るさ (1 - 極角 / π) の全フレーム共通の範囲 (min, max) を返します。
+
+    polar_component は極軸の成分のインデックス (面に垂直な軸) です。
+    normalization が 'per frame' の場合や 3成分のベクトルでない場合は None を返します。
+    """
+    keys = NORMALIZATIONS[normalization]
+    if keys is None or "polar_cos" not in stats:
+        return None
+
+    cos_low, cos_high = get_stat_pair(stats["polar_cos"][polar_component], keys)
+    if cos_low is None or cos_high is None:
+        return None
+
+    # 明るさは方向余弦に対して単調増加
+    brightness = 1 - np.arccos(np.clip([cos_low, cos_high], -1, 1)) / np.pi
+    return float(brightness[0]), float(brightness[1])
+
+
+def get_stat_pair(component_stats, keys):
+    """("min", "max") やパーセンタイル ("1", "99") のキーの組に対応する値の組を返します"""
+    values = []
+    for key in keys:
+        if key in ("min", "max"):
+            values.append(component_stats[key])
+        else:
+            values.append(component_stats["percentiles"].get(key))
+    return tuple(values)
@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import zlib
+import lzma
+import struct
+import argparse
+import threading
+
+import numpy as np
+
+import read_ovf_files as rof
+import ovf_index as oi
+
+# ストアファイルの拡張子
+STORE_EXTENSION = ".ovfs"
+
+# ストアファイル先頭のマジックナンバー
+STORE_MAGIC = b"OVFSTORE"
+
+# ストアファイル末尾のトレーラー (インデックスの位置, インデックスのバイト数, マジックナンバー)
+TRAILER_FORMAT = "<QQ8s"
+TRAILER_MAGIC = b"OVFSIDX1"
+
+# ストアファイルの形式のバージョン (形式を変更した場合は更新する)
+STORE_VERSION = 1
+
+# 圧縮形式ごとの (圧縮関数, 展開関数)
+COMPRESSORS = {
+    "none": (lambda data, level: data, lambda data: data),
+    "zlib": (lambda data, level: zlib.compress(data, 6 if level is None else level), zlib.decompress),
+    "lzma": (lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+}
+
+# ストアに保存しないヘッダーキー (元のファイル上のバイト位置)
+FILE_OFFSET_KEYS = ("header_size", "data_offset", "data_size", "footer_offset")
+
+
+def is_store_file(path):
+    """パスがストアファイルかどうかを返します"""
+    return path.lower().endswith(STORE_EXTENSION) and os.path.isfile(path)
+
+
+def convert_directory(directory, store_path=None, compression="zlib", level=None, dtype=None):
+    """
+    ディレクトリ内の OVF ファイルを1つのストアファイルにまとめます。
+
+    各フレーム (ファイル、または複数セグメントファイルの各セグメント) を
+    z 面ごとのチャンクとして (必要に応じて圧縮して) 書き込み、最後に
+    各チャンクの位置と各フレームのヘッダーを含むインデックスを書き込みます。
+    任意の (フレーム, z 面) は1チャンクの読み込みで取得できます。
+
+    Parameters
+    ----------
+    directory : str
+        OVF ファイルを含むディレクトリ
+    store_path : str, optional
+        出力するストアファイルのパス。None の場合は "<directory>.ovfs"。
+    compression : str, optional
+        チャンクの圧縮形式 ('none', 'zlib' または 'lzma')。デフォルトは 'zlib'。
+    level : int, optional
+        圧縮レベル (zlib は 0-9、lzma は 0-9 のプリセット)
+    dtype : numpy.dtype, optional
+        保存する dtype。None の場合は各ファイルの精度を保持します。
+
+    Returns
+    -------
+    str
+        作成したストアファイルのパス
+    """
+    if compression not in COMPRESSORS:
+        raise ValueError(f"Unsupported compression: {compression}")
+    compress = COMPRESSORS[compression][0]
+
+    directory = os.path.normpath(directory)
+    if store_path is None:
+        store_path = directory + STORE_EXTENSION
+
+    frames = []
+    tmp_path = store_path + ".tmp"
+
+    with open(tmp_path, "wb") as file:
+        file.write(STORE_MAGIC)
+
+        for name in oi.update_index(directory)["files"]:
+            for header, data in rof.iter_ovf_segments(os.path.join(directory, name), dtype):
+                if header.get("segment_count", 1) > 1:
+                    frame_name = f"{rof.strip_ovf_extension(name)}_{header['segment_index']:04d}.ovf"
+                else:
+                    frame_name = name
+
+                data = data.astype(data.dtype.newbyteorder("<"), copy=False)
+                chunks = []
+                for layer in data:
+                    chunk = compress(layer.tobytes(), level)
+                    chunks.append((file.tell(), len(chunk)))
+                    file.write(chunk)
+
+                header = {key: value for key, value in header.items() if key not in FILE_OFFSET_KEYS}
+                header["segment_count"] = 1
+                header["segment_index"] = 0
+                frames.append({"name": frame_name, "dtype": data.dtype.str, "header": header, "chunks": chunks})
+
+        index = {"version": STORE_VERSION, "compression": compression, "frames": frames}
+        index_bytes = zlib.compress(json.dumps(index).encode("utf-8"))
+        index_offset = file.tell()
+        file.write(index_bytes)
+        file.write(struct.pack(TRAILER_FORMAT, index_offset, len(index_bytes), TRAILER_MAGIC))
+
+    os.replace(tmp_path, store_path)
+
+    return store_path
+
+
+class OvfStore:
+    """
+    convert_directory で作成したストアファイルを読み込むクラスです。
+
+    read_ovf_plane / iter_ovf_planes は read_ovf_files の同名の関数と同じ形式の
+    (面のデータ, ヘッダー情報) を返すため、OVF ファイルのディレクトリの代わりに使えます。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.lock = threading.Lock()  # 複数スレッドからの seek + read を保護
+
+        if self.file.read(len(STORE_MAGIC)) != STORE_MAGIC:
+            self.file.close()
+            raise ValueError("Invalid OVF store file.")
+
+        trailer_size = struct.calcsize(TRAILER_FORMAT)
+        self.file.seek(-trailer_size, os.SEEK_END)
+        index_offset, index_size, magic = struct.unpack(TRAILER_FORMAT, self.file.read(trailer_size))
+        if magic != TRAILER_MAGIC:
+            self.file.close()
+            raise ValueError("Invalid OVF store file.")
+
+        self.file.seek(index_offset)
+        index = json.loads(zlib.decompress(self.file.read(index_size)).decode("utf-8"))
+        if index.get("version") != STORE_VERSION:
+            self.file.close()
+            raise ValueError("Unsupported OVF store version.")
+
+        self.decompress = COMPRESSORS[index["compression"]][1]
+        self.frames = {frame["name"]: frame for frame in index["frames"]}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    @property
+    def names(self):
+        """フレーム名のリスト (保存した順)"""
+        return list(self.frames)
+
+    def get_index_files(self):
+        """ovf_index.update_index の "files" と同じ形式の {フレーム名: エントリ} を返します"""
+        return {name: {"size": None, "mtime": None, "header": frame["header"]} for name, frame in self.frames.items()}
+
+    def read_layer(self, name, z):
+        """フレーム name の z 面 (ynodes, xnodes, valuedim) を1チャンクの読み込みで返します"""
+        frame = self.frames[name]
+        header = frame["header"]
+        offset, size = frame["chunks"][z]
+
+        with self.lock:
+            self.file.seek(offset)
+            chunk = self.file.read(size)
+
+        layer = np.frombuffer(self.decompress(chunk), dtype=frame["dtype"])
+        return layer.reshape(header["ynodes"], header["xnodes"], header["valuedim"])
+
+    def read_ovf_plane(self, name, unused_axis, plane_index, dtype=None, out=None, roi=None):
+        """
+        フレーム name の unused_axis に垂直な1面を読み込みます。
+
+        z 面は1チャンク、x 面と y 面は z ごとの各チャンクから切り出します。
+        roi (read_ovf_files.read_ovf_plane と同じ面の中の範囲) を指定した場合、
+        x 面と y 面は ROI の z の範囲のチャンクのみを読み込みます。
+        戻り値は read_ovf_files.read_ovf_plane と同じ (面のデータ, ヘッダー情報) です。
+        """
+        frame = self.frames[name]
+        header = dict(frame["header"])
+        rof.check_plane_index(header, unused_axis, plane_index)
+
+        row_slice, col_slice = rof.get_roi_slices(header, unused_axis, roi)
+        out_dtype = np.dtype(dtype) if dtype is not None else np.dtype(frame["dtype"]).newbyteorder("=")
+        plane = rof.get_output_array(rof.get_roi_shape(header, unused_axis, roi), out_dtype, out)
+
+        if unused_axis == "z":
+            plane[...] = self.read_layer(name, plane_index)[row_slice, col_slice]
+        else:
+            for z in range(row_slice.start, row_slice.stop):
+                layer = self.read_layer(name, z)
+                plane[z - row_slice.start] = layer[plane_index, col_slice] if unused_axis == "y" else layer[col_slice, plane_index]
+
+        return plane, header
+
+    def iter_ovf_planes(self, name, unused_axis, plane_index, dtype=None, roi=None):
+        """read_ovf_files.iter_ovf_planes と同じ形式で、フレーム name の1面を返します"""
+        plane, header = self.read_ovf_plane(name, unused_axis, plane_index, dtype, roi=roi)
+        yield header, plane
+
+    def read_ovf_projection(self, name, unused_axis, mode, dtype=None, roi=None):
+        """
+        フレーム name を unused_axis 方向に集約した1面を読み込みます。
+        z 面のチャンクを1つずつ集約するため、フレーム全体は読み込みません。
+        戻り値は read_ovf_files.read_ovf_projection と同じ (投影したデータ, ヘッダー情報) です。
+        """
+        frame = self.frames[name]
+        header = dict(frame["header"])
+        blocks = ((z, self.read_layer(name, z)[np.newaxis]) for z in range(header["znodes"]))
+        projection = rof.crop_plane(rof.project_layers(blocks, header, unused_axis, mode), header, unused_axis, roi)
+        return projection.astype(dtype if dtype is not None else np.dtype(frame["dtype"]).newbyteorder("="), copy=False), header
+
+    def iter_ovf_projections(self, name, unused_axis, mode, dtype=None, roi=None):
+        """read_ovf_files.iter_ovf_projections と同じ形式で、フレーム name の投影を返します"""
+        projection, header = self.read_ovf_projection(name, unused_axis, mode, dtype, roi=roi)
+        yield header, projection
+
+    def read_ovf_file(self, name, dtype=None):
+        """フレーム name 全体を (データ, ヘッダー情報) として読み込みます"""
+        frame = self.frames[name]
+        header = dict(frame["header"])
+        layers = [self.read_layer(name, z) for z in range(header["znodes"])]
+        data = np.stack(layers).astype(dtype if dtype is not None else np.dtype(frame["dtype"]).newbyteorder("="))
+        return data, header
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a directory of OVF files into a chunked OVF store file.")
+    parser.add_argument("directory", help="directory containing OVF files")
+    parser.add_argument("-o", "--output", default=None, help="output store file (default: <directory>.ovfs)")
+    parser.add_argument("-c", "--compression", choices=list(COMPRESSORS), default="zlib", help="chunk compression")
+    parser.add_argument("-l", "--level", type=int, default=None, help="compression level")
+    parser.add_argument("--float32", action="store_true", help="store data as float32")
+    args = parser.parse_args()
+
+    store_path = convert_directory(args.directory, args.output, args.compression, args.level, np.float32 if args.float32 else None)
+    print(f"OVF store saved to {store_path}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
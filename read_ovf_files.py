@@ -1,7 +1,244 @@
+import os
+import re
+import gzip
+import bz2
+import lzma
+import zlib
 import struct
+import tarfile
+import zipfile
+import calendar
+import threading
 import numpy as np
 
-def read_ovf_file(filename, output_mode='both'):
+# 読み込み可能な OVF ファイルの拡張子 (圧縮ファイルを含む)
+OVF_EXTENSIONS = ('.ovf', '.ovf.gz', '.ovf.bz2', '.ovf.xz')
+
+# 圧縮形式ごとの拡張子と open 関数 (標準ライブラリでストリーミング展開)
+COMPRESSED_OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+}
+
+# 面の代わりに unused_axis 方向に集約する投影モード
+PROJECTION_MODES = ('mean', 'max-abs', 'sum', 'rms')
+
+# 入力ディレクトリの代わりに指定できるアーカイブの拡張子
+# (圧縮した tar はメンバーを読み込むたびに先頭から展開し直すことになるため対象外)
+ARCHIVE_EXTENSIONS = ('.zip', '.tar')
+
+# バイナリ形式ごとの (ファイル上の型, コントロールナンバー)
+# バイトオーダーは OVF のバージョンで決まる (get_file_dtype を参照)
+BINARY_FORMATS = {
+    'binary 4': ('f4', 1234567.0),
+    'binary 8': ('f8', 123456789012345.0),
+}
+
+# 型変換しながら読み込む際の一時バッファサイズ (バイト)
+CHUNK_SIZE = 1 << 24
+
+# テキスト形式のデータセクションを読み込む際のチャンクサイズ (バイト)
+TEXT_CHUNK_SIZE = 1 << 20
+
+# ヘッダーを読み込む際のチャンクサイズ (バイト)
+HEADER_CHUNK_SIZE = 4096
+
+# バイナリ形式のデータ本体の後に続くフッターの最小サイズ ('# End: Data Binary 4' と '# End: Segment' の行)
+MIN_FOOTER_SIZE = len(b'# End: Data Binary 4\n# End: Segment')
+
+# 最後まで書き込まれているかをファイル末尾で確認する場合に読み込むバイト数
+FILE_TAIL_SIZE = 256
+
+# 途中までしか書き込まれていないファイルや壊れたファイルの読み込みで送出される例外
+READ_ERRORS = (OSError, EOFError, ValueError, zlib.error, lzma.LZMAError, zipfile.BadZipFile, tarfile.TarError)
+
+# ファイルの最後のセグメントの終了行
+SEGMENT_END_PATTERN = re.compile(rb'#[ \t]*end:[ \t]*segment', re.IGNORECASE)
+
+# データセクションの開始行 ('# Begin: Data Binary 4' など)
+DATA_BEGIN_PATTERN = re.compile(rb'^#[ \t]*begin:[ \t]*data[ \t]+([^\r\n]*?)[ \t]*\r?\n', re.IGNORECASE | re.MULTILINE)
+
+# Desc 行のシミュレーション時間 ('Total simulation time: 1e-9 s' / 'Time (s) : 1e-9')
+SIMULATION_TIME_PATTERN = re.compile(r'(?:total simulation time|time \(s\))\s*:\s*([-+0-9.eE]+)', re.IGNORECASE)
+
+# 整数として読み込むヘッダーキー (ファイル上のキー -> 辞書のキー)
+INT_HEADER_KEYS = {
+    'xnodes': 'xnodes',
+    'ynodes': 'ynodes',
+    'znodes': 'znodes',
+    'valuedim': 'valuedim',
+    'segment count': 'segment_count',
+}
+
+# 実数として読み込むヘッダーキー
+FLOAT_HEADER_KEYS = (
+    'xmin', 'ymin', 'zmin', 'xmax', 'ymax', 'zmax',
+    'xbase', 'ybase', 'zbase', 'xstepsize', 'ystepsize', 'zstepsize',
+    'valuemultiplier', 'valuerangeminmag', 'valuerangemaxmag',
+)
+
+# アーカイブのメンバー一覧のキャッシュ {アーカイブのパス: ((サイズ, 更新時刻), ZipFile または None, {メンバー名: ZipInfo / TarInfo})}
+_archive_cache = {}
+_archive_cache_lock = threading.Lock()
+
+
+def is_ovf_file(filename):
+    """ファイル名が OVF ファイル (圧縮ファイルを含む) かどうかを返します"""
+    return filename.lower().endswith(OVF_EXTENSIONS)
+
+
+def is_compressed(filename):
+    """ファイル名が圧縮された OVF ファイルかどうかを返します"""
+    return os.path.splitext(filename)[1].lower() in COMPRESSED_OPENERS
+
+
+def strip_ovf_extension(filename):
+    """ファイル名から OVF の拡張子 ('.ovf', '.ovf.gz' など) を除いた名前を返します"""
+    for extension in sorted(OVF_EXTENSIONS, key=len, reverse=True):
+        if filename.lower().endswith(extension):
+            return filename[:-len(extension)]
+    return os.path.splitext(filename)[0]
+
+
+def can_memmap(filename):
+    """ファイルをメモリマップで読み込めるか (圧縮ファイルやアーカイブのメンバーでないか) を返します"""
+    return not is_compressed(filename) and split_archive_path(filename) is None
+
+
+def open_ovf_file(filename):
+    """
+    OVFファイルをバイナリ読み込みモードで開きます。
+
+    圧縮ファイル (.ovf.gz / .ovf.bz2 / .ovf.xz) の場合は、読み込んだ分だけ
+    展開するファイルオブジェクトを返します。
+    'runs.zip/m000000.ovf' のようなアーカイブ内のパスの場合は、
+    展開せずにメンバーを直接読み込むファイルオブジェクトを返します。
+    """
+    opener = COMPRESSED_OPENERS.get(os.path.splitext(filename)[1].lower())
+
+    archive_member = split_archive_path(filename)
+    if archive_member is not None:
+        file = open_archive_member(*archive_member)
+        if opener is not None:
+            return ArchiveMemberFile(opener(file, 'rb'), file)
+        return file
+
+    if opener is not None:
+        return opener(filename, 'rb')
+    return open(filename, 'rb')
+
+
+def is_archive_file(path):
+    """パスが入力として読み込めるアーカイブ (.zip / .tar) かどうかを返します"""
+    return path.lower().endswith(ARCHIVE_EXTENSIONS) and os.path.isfile(path)
+
+
+def split_archive_path(path):
+    """
+    'runs.zip/m000000.ovf' のようなアーカイブ内のパスを (アーカイブのパス, メンバー名) に分割します。
+    アーカイブ内のパスでない場合は None を返します。
+    """
+    normalized = path.replace('\\', '/')
+    lower = normalized.lower()
+    for extension in ARCHIVE_EXTENSIONS:
+        position = lower.find(extension + '/')
+        while position >= 0:
+            end = position + len(extension)
+            if os.path.isfile(path[:end]):
+                return path[:end], normalized[end + 1:]
+            position = lower.find(extension + '/', end)
+    return None
+
+
+def get_archive_members(archive_path):
+    """
+    アーカイブの {メンバー名: ZipInfo / TarInfo} を返します。
+
+    メンバー一覧 (zip の central directory / tar の各メンバーのヘッダー) の読み込みは
+    アーカイブごとに1回のみで、アーカイブのサイズと更新時刻が変わるまでキャッシュします。
+    """
+    return get_archive_cache(archive_path)[2]
+
+
+def get_archive_cache(archive_path):
+    """アーカイブのキャッシュ ((サイズ, 更新時刻), ZipFile または None, メンバー一覧) を返します"""
+    stat = os.stat(archive_path)
+    key = (stat.st_size, stat.st_mtime_ns)
+
+    with _archive_cache_lock:
+        cached = _archive_cache.get(archive_path)
+        if cached is not None and cached[0] == key:
+            return cached
+        if cached is not None and cached[1] is not None:
+            cached[1].close()
+
+        try:
+            if archive_path.lower().endswith('.zip'):
+                # zip は central directory の読み込みを繰り返さないよう開いたまま保持する
+                archive = zipfile.ZipFile(archive_path)
+                members = {info.filename: info for info in archive.infolist() if not info.is_dir()}
+            else:
+                archive = None
+                with tarfile.open(archive_path, 'r:') as tar:
+                    members = {info.name: info for info in tar.getmembers() if info.isfile()}
+        except (zipfile.BadZipFile, tarfile.TarError) as e:
+            raise ValueError(f"Invalid archive file: {archive_path}") from e
+
+        cached = (key, archive, members)
+        _archive_cache[archive_path] = cached
+        return cached
+
+
+def list_archive_members(archive_path):
+    """アーカイブ内の OVF ファイル (圧縮ファイルを含む) の (メンバー名, サイズ, 更新時刻 (ns)) を列挙します"""
+    for name, info in get_archive_members(archive_path).items():
+        if not is_ovf_file(name):
+            continue
+        if isinstance(info, zipfile.ZipInfo):
+            yield name, info.file_size, calendar.timegm(info.date_time + (0, 0, 0)) * 10**9
+        else:
+            yield name, info.size, int(info.mtime) * 10**9
+
+
+def open_archive_member(archive_path, name):
+    """アーカイブのメンバーを展開せずに読み込むファイルオブジェクトを返します"""
+    _, archive, members = get_archive_cache(archive_path)
+    info = members.get(name)
+    if info is None:
+        raise FileNotFoundError(f"{name} not found in {archive_path}")
+
+    if archive is not None:
+        return archive.open(info)
+
+    # tar はメンバーごとに開き直す (キャッシュした TarInfo を使うためメンバー一覧は再読み込みしない)
+    tar = tarfile.open(archive_path, 'r:')
+    return ArchiveMemberFile(tar.extractfile(info), tar)
+
+
+class ArchiveMemberFile:
+    """ファイルオブジェクトを閉じる際に、その読み込み元 (アーカイブなど) も閉じるラッパーです"""
+
+    def __init__(self, file, *sources):
+        self.file = file
+        self.sources = sources
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.file.close()
+        for source in self.sources:
+            source.close()
+
+
+def read_ovf_file(filename, output_mode='both', dtype=None, out=None):
     """
     OVFファイルを読み込み、バイナリ形式またはテキスト形式でデータを読み込みます。
     
@@ -10,100 +247,774 @@ def read_ovf_file(filename, output_mode='both'):
     filename : str
         読み込むOVFファイルの名前
     output_mode : str, optional
-        出力モードを指定 ('headers' または 'both')。
+        出力モードを指定 ('headers', 'both' または 'mmap')。
         デフォルトは 'both'。
+        'mmap' の場合、バイナリ形式のデータセクションを読み取り専用の
+        メモリマップとして返します (スライスした部分のみがディスクから
+        読み込まれます)。テキスト形式、圧縮ファイルとアーカイブのメンバーの
+        場合は 'both' と同様に読み込みます。
+    dtype : numpy.dtype, optional
+        出力配列の dtype。None の場合はファイルの精度を保持します
+        (Binary 4 / Text は float32、Binary 8 は float64)。
+        指定した場合は読み込み中にチャンク単位で変換するため、
+        全体サイズの一時配列は確保しません。
+    out : numpy.ndarray, optional
+        データを書き込む (znodes, ynodes, xnodes, valuedim) の C 連続配列。
+        指定した場合、新しい配列を確保せずに out に直接読み込みます
+        (dtype は out の dtype になります)。output_mode='both' の場合のみ有効です。
     
     Returns
     -------
     tuple or dict
         output_mode='headers' の場合、ヘッダー情報の辞書を返します。
         output_mode='both' の場合、(データ, ヘッダー情報) のタプルを返します。
+        output_mode='mmap' の場合、(numpy.memmap, ヘッダー情報) のタプルを返します。
+        ヘッダー情報の内容は read_headers を参照してください。
     """
-    headers = {}
     data = None
 
-    with open(filename, 'rb') as file:
+    with open_ovf_file(filename) as file:
         # ヘッダーを読み込み
-        while True:
-            line = file.readline().decode('utf-8').strip()
-            if line.startswith('#'):
-                if 'xnodes' in line:
-                    headers['xnodes'] = int(line.split()[-1])
-                elif 'ynodes' in line:
-                    headers['ynodes'] = int(line.split()[-1])
-                elif 'znodes' in line:
-                    headers['znodes'] = int(line.split()[-1])
-                elif 'valuedim' in line:
-                    headers['valuedim'] = int(line.split()[-1])
-                elif 'valuelabels' in line:
-                    headers['valuelabels'] = line.split()[-1]
-                elif line.lower().startswith('# begin: data'):
-                    data_format = line.lower().replace('# begin: data', '').strip()
-                    # print(data_format)
-                    break  # データセクションに到達
-            else:
-                raise ValueError("Unexpected file format.")
-
-        # xnodes, ynodes, znodes, valuedim がすべて揃っているか確認
-        if not all(k in headers for k in ('xnodes', 'ynodes', 'znodes', 'valuedim')):
-            raise ValueError("Incomplete header information.")
+        headers = read_headers(file)
+        data_format = headers['data_format']
 
         # output_mode が 'headers' の場合、ここで終了
         if output_mode == 'headers':
             return headers
 
         # データの読み込み
-        if data_format == 'binary 4':
-            data = read_binary_data(file, headers)
+        if output_mode == 'mmap' and data_format in BINARY_FORMATS and can_memmap(filename):
+            data = memmap_binary_data(filename, file, headers, data_format)
+        elif data_format in BINARY_FORMATS:
+            data = read_binary_data(file, headers, data_format, dtype, out)
         elif data_format == 'text':
-            data = read_text_data(file, headers)
+            data = read_text_data(file, headers, dtype, out)
         else:
             raise ValueError(f"Unsupported data format: {data_format}")
 
     return data, headers
 
 
-def read_binary_data(file, headers):
-    """Binary形式でデータを読み込みます"""
+def read_headers(file):
+    """
+    ファイルの現在位置からデータセクションの開始行までヘッダーを読み込みます。
+
+    ヘッダーは HEADER_CHUNK_SIZE ごとにまとめて読み込んで解析し、
+    読み込み後、file の位置はデータセクションの先頭 (開始行の直後) になります。
+    OVF 1.0 / 2.0 の標準的なキーに加えて、以下の情報を含む辞書を返します。
+
+    - 'ovf_version' : OVF のバージョン (1 または 2、不明な場合は None)
+    - 'desc' : Desc 行のリスト
+    - 'total_simulation_time' : Desc 行から取得したシミュレーション時間 (s)
+    - 'data_format' : データ形式 ('binary 4', 'binary 8' または 'text')
+    - 'header_size' : データセクションの開始位置 (バイト)
+    - 'data_offset' : データ本体の開始位置 (バイナリ形式のみ、コントロールナンバーの直後)
+    - 'data_size' : データ本体のバイト数 (バイナリ形式のみ)
+    - 'footer_offset' : データ本体の直後の位置 (バイナリ形式のみ)
+    """
+    base = file.tell()
+    buffer = b''
+
+    # データセクションの開始行が見つかるまでチャンク単位で読み込む
+    while True:
+        chunk = file.read(HEADER_CHUNK_SIZE)
+        buffer += chunk
+        match = DATA_BEGIN_PATTERN.search(buffer)
+        if match:
+            break
+        if not chunk:
+            raise ValueError("Unexpected file format.")
+
+    header_size = base + match.end()
+    file.seek(header_size)
+
+    headers = parse_header_lines(buffer[:match.start()].decode('utf-8', errors='replace').splitlines())
+    data_format = ' '.join(match.group(1).decode('ascii', errors='replace').lower().split())
+
+    # OVF 1.0 のベクトル場ファイルには valuedim が無い
+    if 'valuedim' not in headers and headers.get('ovf_version') == 1:
+        headers['valuedim'] = 3
+
+    # xnodes, ynodes, znodes, valuedim がすべて揃っているか確認
+    if not all(k in headers for k in ('xnodes', 'ynodes', 'znodes', 'valuedim')):
+        raise ValueError("Incomplete header information.")
+
+    headers['data_format'] = data_format
+    headers['header_size'] = header_size
+
+    # バイナリ形式の場合、データ本体とフッターのバイト位置を記録 (コントロールナンバーの直後)
+    if data_format in BINARY_FORMATS:
+        itemsize = get_file_dtype(headers).itemsize
+        headers['data_offset'] = header_size + itemsize
+        headers['data_size'] = headers['xnodes'] * headers['ynodes'] * headers['znodes'] * headers['valuedim'] * itemsize
+        headers['footer_offset'] = headers['data_offset'] + headers['data_size']
+
+    return headers
+
+
+def parse_header_lines(lines):
+    """ヘッダー部分の各行 ('# key: value') を解析し、ヘッダー情報の辞書を返します"""
+    headers = {'desc': []}
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if not line.startswith('#'):
+            raise ValueError("Unexpected file format.")
+
+        # '##' 以降はコメント
+        line = line.split('##')[0]
+
+        key, separator, value = line.lstrip('#').partition(':')
+        key = key.strip().lower()
+        value = value.strip()
+
+        if not separator:
+            # '# OOMMF OVF 2.0' のようなバージョン行
+            if 'ovf 2' in key:
+                headers['ovf_version'] = 2
+            elif 'ovf 1' in key:
+                headers['ovf_version'] = 1
+        elif key == 'oommf':
+            # '# OOMMF: rectangular mesh v1.0' (OVF 1.0)
+            headers['ovf_version'] = 1 if 'v1' in value.lower() else headers.get('ovf_version')
+        elif key in INT_HEADER_KEYS:
+            headers[INT_HEADER_KEYS[key]] = int(value)
+        elif key in FLOAT_HEADER_KEYS:
+            headers[key] = float(value)
+        elif key in ('valuelabels', 'valueunits'):
+            headers[key] = value.split()
+        elif key in ('title', 'meshtype', 'meshunit', 'valueunit', 'valuelabel'):
+            headers[key] = value
+        elif key == 'desc':
+            headers['desc'].append(value)
+            match = SIMULATION_TIME_PATTERN.search(value)
+            if match:
+                headers['total_simulation_time'] = float(match.group(1))
+
+    return headers
+
+
+def get_file_dtype(headers):
+    """
+    バイナリ形式のファイル上の dtype を返します。
+
+    OVF 1.0 のバイナリデータはビッグエンディアン (ネットワークバイトオーダー)、
+    OVF 2.0 はリトルエンディアンです。
+    """
+    byteorder = '>' if headers.get('ovf_version') == 1 else '<'
+    return np.dtype(byteorder + BINARY_FORMATS[headers['data_format']][0])
+
+
+def read_control_number(file, headers):
+    """バイナリ形式のコントロールナンバーを読み込んで確認し、ファイル上の dtype を返します"""
+    data_format = headers['data_format']
+    expected_control_number = BINARY_FORMATS[data_format][1]
+    file_dtype = get_file_dtype(headers)
+
+    # OOMMF コントロールナンバーを読み込む（バイナリフォーマット識別用）
+    control_number = struct.unpack(file_dtype.str[0] + file_dtype.char, file.read(file_dtype.itemsize))[0]
+    if control_number != expected_control_number:
+        raise ValueError(f"Invalid OVF control number for {data_format.title()} format.")
+
+    return file_dtype
+
+
+def get_file_size(filename):
+    """ファイル (アーカイブのメンバーの場合は展開後のメンバー) のサイズ (バイト) を返します"""
+    archive_member = split_archive_path(filename)
+    if archive_member is None:
+        return os.path.getsize(filename)
+    info = get_archive_members(archive_member[0])[archive_member[1]]
+    return info.file_size if isinstance(info, zipfile.ZipInfo) else info.size
+
+
+def get_expected_file_size(headers):
+    """
+    ヘッダーのノード数とデータ形式から、最後まで書き込まれたファイルの最小サイズ (バイト) を返します。
+
+    データ本体の終了位置 ('footer_offset') にフッターの最小サイズを加えた値です。
+    テキスト形式と複数セグメントのファイルはヘッダーからサイズを決められないため None を返します。
+    """
+    if 'footer_offset' not in headers or headers.get('segment_count', 1) > 1:
+        return None
+    return headers['footer_offset'] + MIN_FOOTER_SIZE
+
+
+def validate_ovf_file(filename, headers=None, file_size=None):
+    """
+    OVFファイルが最後まで書き込まれているかを、データを読み込まずに確認します。
+
+    バイナリ形式のファイルは、ファイルサイズとヘッダーから求めたサイズ
+    (get_expected_file_size) を比較するだけなので、headers と file_size を
+    インデックスから渡せばファイルを開きません。複数セグメントのファイルは
+    is_complete_segments で全セグメントが揃っているかを確認し、セグメントが1つの
+    テキスト形式のファイルは、ファイル末尾の FILE_TAIL_SIZE バイトに '# End: Segment' が
+    あるかを確認します。圧縮ファイルはサイズからは判定できないため、
+    ヘッダーが読み込めれば True を返します (途中までの場合は読み込み時にエラーになります)。
+
+    Parameters
+    ----------
+    filename : str
+        確認するOVFファイルの名前
+    headers : dict, optional
+        ファイルのヘッダー情報。None の場合はファイルから読み込みます。
+    file_size : int, optional
+        ファイルサイズ (バイト)。None の場合はファイルシステムから取得します。
+
+    Returns
+    -------
+    bool
+        最後まで書き込まれている場合は True
+    """
+    try:
+        if headers is None:
+            headers = read_ovf_file(filename, output_mode='headers')
+        if is_compressed(filename):
+            return True
+
+        if file_size is None:
+            file_size = get_file_size(filename)
+        expected_size = get_expected_file_size(headers)
+        if expected_size is not None:
+            return file_size >= expected_size
+
+        with open_ovf_file(filename) as file:
+            segment_count = headers.get('segment_count', 1)
+            if segment_count > 1:
+                return is_complete_segments(file, file_size, segment_count)
+
+            # セグメントが1つのテキスト形式はファイル末尾の終了行を確認
+            file.seek(max(0, file_size - FILE_TAIL_SIZE))
+            return SEGMENT_END_PATTERN.search(file.read(FILE_TAIL_SIZE)) is not None
+    except READ_ERRORS + (KeyError,):
+        return False
+
+
+def is_complete_segments(file, file_size, segment_count):
+    """
+    複数セグメントのファイルに segment_count 個のセグメントが最後まで書き込まれているかを返します。
+
+    バイナリ形式のセグメントはヘッダーのみを読み込み、データ本体は seek で飛ばして
+    次のセグメントに進みます (最初のセグメントだけで途切れたファイルも検出できます)。
+    テキスト形式のセグメントを含む場合は、ファイル全体の '# End: Segment' の行を数えます。
+    """
+    for _ in range(segment_count):
+        headers = read_headers(file)
+        if headers['data_format'] not in BINARY_FORMATS:
+            file.seek(0)
+            return count_segment_ends(file) >= segment_count
+        if file_size < headers['footer_offset'] + MIN_FOOTER_SIZE:
+            return False
+        file.seek(headers['footer_offset'])
+    return True
+
+
+def count_segment_ends(file):
+    """ファイルの現在位置から末尾までの '# End: Segment' の行を TEXT_CHUNK_SIZE ごとに読み込んで数えます"""
+    count = 0
+    tail = b''
+    while True:
+        chunk = file.read(TEXT_CHUNK_SIZE)
+        if not chunk:
+            return count
+        buffer = tail + chunk
+        matches = list(SEGMENT_END_PATTERN.finditer(buffer))
+        count += len(matches)
+        # チャンクの境界をまたぐ終了行のために末尾を残す (数えた行は含めない)
+        keep_from = max(len(buffer) - FILE_TAIL_SIZE, matches[-1].end() if matches else 0)
+        tail = buffer[keep_from:]
+
+
+def read_ovf_plane(filename, unused_axis, plane_index, dtype=None, out=None, roi=None):
+    """
+    OVFファイルから、指定した軸に垂直な1面分のデータのみを読み込みます。
+
+    read_ovf_file で全体を読み込んでから array[plane_index] などで
+    切り出した場合と同じ配列を返しますが、必要なバイトのみを読み込みます。
+    バイナリ形式の場合、z 面は1回の seek + read、y 面は z ごとの行の読み込み、
+    x 面はメモリマップを用いたストライドアクセスで読み込みます
+    (圧縮ファイルとアーカイブのメンバーの場合は z ごとに1層ずつ読み込んで切り出します)。
+    テキスト形式の場合は全体を読み込んでから切り出します。
+    roi を指定した場合、バイナリ形式では ROI の行・列の範囲のみを読み込みます。
+
+    Parameters
+    ----------
+    filename : str
+        読み込むOVFファイルの名前
+    unused_axis : str
+        面に垂直な軸 ('x', 'y' または 'z')
+    plane_index : int
+        unused_axis 方向の面のインデックス
+    dtype : numpy.dtype, optional
+        出力配列の dtype。None の場合はファイルの精度を保持します。
+    out : numpy.ndarray, optional
+        面のデータを書き込む C 連続配列。指定した場合は out に直接読み込みます。
+    roi : tuple, optional
+        面の中の読み込む範囲 ((行の開始, 行の終了), (列の開始, 列の終了))。終了は含みません。
+        行・列は下記の面のデータの形状の先頭の2軸です。None の場合は面全体を読み込みます。
+
+    Returns
+    -------
+    tuple
+        (面のデータ, ヘッダー情報) のタプル。面のデータの形状は
+        unused_axis='z' の場合 (ynodes, xnodes, valuedim)、
+        'y' の場合 (znodes, xnodes, valuedim)、
+        'x' の場合 (znodes, ynodes, valuedim) です (roi を指定した場合は ROI の行数・列数)。
+    """
+    with open_ovf_file(filename) as file:
+        headers = read_headers(file)
+        data_format = headers['data_format']
+
+        xnodes = headers['xnodes']
+        ynodes = headers['ynodes']
+        znodes = headers['znodes']
+        valuedim = headers['valuedim']
+
+        check_plane_index(headers, unused_axis, plane_index)
+
+        row_slice, col_slice = get_roi_slices(headers, unused_axis, roi)
+        plane_shape = get_roi_shape(headers, unused_axis, roi)
+
+        if data_format == 'text':
+            data = read_text_data(file, headers, dtype)
+            plane = get_output_array(plane_shape, data.dtype, out)
+            plane[...] = slice_plane(data, unused_axis, plane_index)[row_slice, col_slice]
+            return plane, headers
+        elif data_format not in BINARY_FORMATS:
+            raise ValueError(f"Unsupported data format: {data_format}")
+
+        file_dtype = read_control_number(file, headers)
+        out_dtype = np.dtype(dtype) if dtype is not None else file_dtype.newbyteorder('=')
+        data_offset = headers['data_offset']
+        row_size = xnodes * valuedim * file_dtype.itemsize
+        col_offset = col_slice.start * valuedim * file_dtype.itemsize
+        is_full_row = plane_shape[1] == get_plane_shape(headers, unused_axis)[1]
+        plane = get_output_array(plane_shape, out_dtype, out)
+
+        if unused_axis == 'z' and is_full_row:
+            # z 面は連続した1ブロック (ROI の行の範囲のみ)
+            file.seek(data_offset + (plane_index * ynodes + row_slice.start) * row_size)
+            read_into_array(file, plane, file_dtype)
+        elif unused_axis == 'z':
+            # 列を絞った z 面は y ごとに ROI の列の範囲のみを読み込む
+            for y in range(row_slice.start, row_slice.stop):
+                file.seek(data_offset + (plane_index * ynodes + y) * row_size + col_offset)
+                read_into_array(file, plane[y - row_slice.start], file_dtype)
+        elif unused_axis == 'y':
+            # y 面は z ごとに1行ずつ飛び飛びに並ぶ
+            for z in range(row_slice.start, row_slice.stop):
+                file.seek(data_offset + (z * ynodes + plane_index) * row_size + col_offset)
+                read_into_array(file, plane[z - row_slice.start], file_dtype)
+        elif not can_memmap(filename):
+            # 圧縮ファイルとアーカイブのメンバーの x 面は z ごとに ROI の行 (y) を展開して切り出す
+            layer = np.empty((plane_shape[1], xnodes, valuedim), dtype=file_dtype)
+            for z in range(row_slice.start, row_slice.stop):
+                file.seek(data_offset + (z * ynodes + col_slice.start) * row_size)
+                read_into_array(file, layer, file_dtype)
+                plane[z - row_slice.start] = layer[:, plane_index]
+        else:
+            # x 面は各行から1セルずつ集めるためメモリマップ経由で取得
+            mapped = np.memmap(filename, dtype=file_dtype, mode='r', offset=data_offset, shape=(znodes, ynodes, xnodes, valuedim))
+            plane[...] = mapped[row_slice, col_slice, plane_index]
+            del mapped
+
+    return plane, headers
+
+
+def get_plane_shape(headers, unused_axis):
+    """unused_axis に垂直な1面分のデータの形状を返します"""
+    return {
+        'x': (headers['znodes'], headers['ynodes'], headers['valuedim']),
+        'y': (headers['znodes'], headers['xnodes'], headers['valuedim']),
+        'z': (headers['ynodes'], headers['xnodes'], headers['valuedim']),
+    }[unused_axis]
+
+
+def get_roi_slices(headers, unused_axis, roi=None):
+    """
+    面の ROI ((行の開始, 行の終了), (列の開始, 列の終了)) を確認し、(行のスライス, 列のスライス) を返します。
+    roi が None の場合は面全体のスライスを返します。
+    """
+    rows, cols = get_plane_shape(headers, unused_axis)[:2]
+    if roi is None:
+        return slice(0, rows), slice(0, cols)
+
+    (row_start, row_stop), (col_start, col_stop) = roi
+    if not (0 <= row_start < row_stop <= rows and 0 <= col_start < col_stop <= cols):
+        raise ValueError(f"ROI {roi} is out of range for the plane ({rows} x {cols}).")
+    return slice(row_start, row_stop), slice(col_start, col_stop)
+
+
+def get_roi_shape(headers, unused_axis, roi=None):
+    """ROI を切り出した面のデータの形状を返します"""
+    row_slice, col_slice = get_roi_slices(headers, unused_axis, roi)
+    return (row_slice.stop - row_slice.start, col_slice.stop - col_slice.start, headers['valuedim'])
+
+
+def crop_plane(plane, headers, unused_axis, roi=None):
+    """面のデータから ROI を連続した配列として切り出します (roi が None の場合はそのまま返します)"""
+    if roi is None:
+        return plane
+    row_slice, col_slice = get_roi_slices(headers, unused_axis, roi)
+    return np.ascontiguousarray(plane[row_slice, col_slice])
+
+
+def get_output_array(shape, dtype, out=None):
+    """出力配列を確保します (out が指定された場合は形状を確認してそのまま返します)"""
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if out.shape != tuple(shape):
+        raise ValueError(f"Output array shape {out.shape} does not match the data shape {tuple(shape)}.")
+    return out
+
+
+def check_plane_index(headers, unused_axis, plane_index):
+    """面のインデックスが unused_axis 方向のノード数の範囲内か確認します"""
+    n_axis = headers[unused_axis + 'nodes']
+    if not 0 <= plane_index < n_axis:
+        raise ValueError(f"Plane index {plane_index} is out of range for the {unused_axis}-axis (0 - {n_axis - 1}).")
+
+
+def slice_plane(data, unused_axis, plane_index):
+    """(znodes, ynodes, xnodes, valuedim) の配列から1面分を連続した配列として切り出します"""
+    # unused_axis 以外の軸では plane_index が範囲外になり得るため、該当する軸のみを切り出す
+    axis = {'z': 0, 'y': 1, 'x': 2}[unused_axis]
+    return np.ascontiguousarray(np.take(data, plane_index, axis=axis))
+
+
+def iter_ovf_segments(filename, dtype=None):
+    """
+    複数のセグメント ('# Segment count: N') を含むOVFファイルを、
+    セグメントごとに (ヘッダー情報, データ) として順に返すジェネレーターです。
+
+    メモリ上に保持するのは常に1セグメント分のデータのみです。
+    各セグメントのヘッダー情報には、ファイル全体の 'ovf_version' と
+    'segment_count'、およびセグメント番号 'segment_index' (0 始まり) が含まれます。
+
+    Parameters
+    ----------
+    filename : str
+        読み込むOVFファイルの名前
+    dtype : numpy.dtype, optional
+        出力配列の dtype。None の場合はファイルの精度を保持します。
+
+    Yields
+    ------
+    tuple
+        (ヘッダー情報, データ) のタプル
+    """
+    with open_ovf_file(filename) as file:
+        file_headers = {}
+
+        segment_index = 0
+        while segment_index < file_headers.get('segment_count', 1):
+            headers = read_headers(file)
+            if segment_index == 0:
+                file_headers = {key: headers[key] for key in ('ovf_version', 'segment_count') if key in headers}
+            headers.update(file_headers)
+            headers['segment_index'] = segment_index
+
+            data_format = headers['data_format']
+            if data_format in BINARY_FORMATS:
+                data = read_binary_data(file, headers, data_format, dtype)
+            elif data_format == 'text':
+                data = read_text_data(file, headers, dtype)
+            else:
+                raise ValueError(f"Unsupported data format: {data_format}")
+
+            yield headers, data
+
+            segment_index += 1
+
+
+def iter_ovf_planes(filename, unused_axis, plane_index, dtype=None, roi=None):
+    """
+    OVFファイルの各セグメントから指定した1面分を (ヘッダー情報, 面のデータ) として返すジェネレーターです。
+
+    セグメントが1つのファイルは read_ovf_plane で必要なバイトのみを読み込み、
+    複数セグメントのファイルは iter_ovf_segments で1セグメントずつ読み込んで切り出します。
+    roi は read_ovf_plane と同じ面の中の範囲です。
+    """
+    headers = read_ovf_file(filename, output_mode='headers')
+    if headers.get('segment_count', 1) <= 1:
+        plane, headers = read_ovf_plane(filename, unused_axis, plane_index, dtype, roi=roi)
+        headers['segment_index'] = 0
+        yield headers, plane
+        return
+
+    check_plane_index(headers, unused_axis, plane_index)
+    for headers, data in iter_ovf_segments(filename, dtype):
+        yield headers, crop_plane(slice_plane(data, unused_axis, plane_index), headers, unused_axis, roi)
+
+
+def read_ovf_projection(filename, unused_axis, mode, dtype=None, roi=None):
+    """
+    OVFファイルを unused_axis 方向に集約 (投影) した1面分のデータを読み込みます。
+
+    データ全体を読み込まずに、z 方向に CHUNK_SIZE 程度ずつ区切ったブロックを順に
+    集約します (メモリマップ、または圧縮ファイルとアーカイブのメンバーは逐次読み込み)。
+    テキスト形式の場合は全体を読み込んでから集約します。
+
+    Parameters
+    ----------
+    filename : str
+        読み込むOVFファイルの名前
+    unused_axis : str
+        集約する軸 ('x', 'y' または 'z')
+    mode : str
+        投影モード ('mean', 'max-abs', 'sum' または 'rms')。
+        'max-abs' は絶対値が最大の値を符号付きで返します。
+    dtype : numpy.dtype, optional
+        出力配列の dtype。None の場合はファイルの精度を保持します。
+        集約は float64 で行います。
+    roi : tuple, optional
+        read_ovf_plane と同じ面の中の範囲。集約した面から切り出します。
+
+    Returns
+    -------
+    tuple
+        (投影したデータ, ヘッダー情報) のタプル。形状は read_ovf_plane と同じです。
+    """
+    with open_ovf_file(filename) as file:
+        headers = read_headers(file)
+        data_format = headers['data_format']
+
+        if data_format == 'text':
+            data = read_text_data(file, headers, dtype)
+            projection = project_layers([(0, data)], headers, unused_axis, mode)
+            return crop_plane(projection, headers, unused_axis, roi).astype(data.dtype, copy=False), headers
+        elif data_format not in BINARY_FORMATS:
+            raise ValueError(f"Unsupported data format: {data_format}")
+
+        file_dtype = read_control_number(file, headers)
+        out_dtype = np.dtype(dtype) if dtype is not None else file_dtype.newbyteorder('=')
+
+        if can_memmap(filename):
+            shape = (headers['znodes'], headers['ynodes'], headers['xnodes'], headers['valuedim'])
+            mapped = np.memmap(filename, dtype=file_dtype, mode='r', offset=headers['data_offset'], shape=shape)
+            projection = project_layers(iter_memmap_layers(mapped, headers), headers, unused_axis, mode)
+            del mapped
+        else:
+            projection = project_layers(iter_binary_layers(file, headers, file_dtype), headers, unused_axis, mode)
+
+    return crop_plane(projection, headers, unused_axis, roi).astype(out_dtype, copy=False), headers
+
+
+def iter_ovf_projections(filename, unused_axis, mode, dtype=None, roi=None):
+    """
+    OVFファイルの各セグメントを unused_axis 方向に集約した1面分を (ヘッダー情報, 投影したデータ) として返すジェネレーターです。
+
+    iter_ovf_planes の投影版です。複数セグメントのファイルは1セグメントずつ読み込んで集約します。
+    """
+    headers = read_ovf_file(filename, output_mode='headers')
+    if headers.get('segment_count', 1) <= 1:
+        projection, headers = read_ovf_projection(filename, unused_axis, mode, dtype, roi=roi)
+        headers['segment_index'] = 0
+        yield headers, projection
+        return
+
+    for headers, data in iter_ovf_segments(filename, dtype):
+        projection = project_layers([(0, data)], headers, unused_axis, mode)
+        yield headers, crop_plane(projection, headers, unused_axis, roi).astype(data.dtype, copy=False)
+
+
+def get_layers_per_chunk(headers, itemsize):
+    """CHUNK_SIZE に収まる z 方向の層の数 (1以上) を返します"""
+    layer_size = headers['ynodes'] * headers['xnodes'] * headers['valuedim'] * itemsize
+    return max(1, CHUNK_SIZE // max(1, layer_size))
+
+
+def iter_memmap_layers(mapped, headers):
+    """(znodes, ynodes, xnodes, valuedim) のメモリマップを z 方向のブロック (開始位置, ブロック) に区切って返します"""
+    n_layers = get_layers_per_chunk(headers, mapped.dtype.itemsize)
+    for z in range(0, len(mapped), n_layers):
+        yield z, mapped[z:z + n_layers]
+
+
+def iter_binary_layers(file, headers, file_dtype):
+    """
+    ファイルの現在位置 (データ本体の先頭) から z 方向のブロックを順に読み込み、(開始位置, ブロック) を返します。
+
+    ブロック用のバッファは使い回すため、返したブロックは次のブロックを読み込むまでに使い終えてください。
+    """
+    znodes = headers['znodes']
+    n_layers = min(znodes, get_layers_per_chunk(headers, file_dtype.itemsize))
+    buffer = np.empty((n_layers, headers['ynodes'], headers['xnodes'], headers['valuedim']), dtype=file_dtype.newbyteorder('='))
+    for z in range(0, znodes, n_layers):
+        block = buffer[:min(n_layers, znodes - z)]
+        read_into_array(file, block, file_dtype)
+        yield z, block
+
+
+def project_layers(blocks, headers, unused_axis, mode):
+    """
+    z 方向のブロック (開始位置, (層数, ynodes, xnodes, valuedim) の配列) を unused_axis 方向に集約します。
+
+    z 方向の投影はブロックごとの結果を累積し、x / y 方向の投影は各ブロックの層を
+    そのまま集約して対応する位置に書き込みます。戻り値は float64 の配列です。
+    """
+    if mode not in PROJECTION_MODES:
+        raise ValueError(f"Unsupported projection mode: {mode}")
+
+    axis = {'z': 0, 'y': 1, 'x': 2}[unused_axis]
+    projection = np.zeros(get_plane_shape(headers, unused_axis), dtype=np.float64)
+
+    for z, block in blocks:
+        target = projection if unused_axis == 'z' else projection[z:z + len(block)]
+        if mode in ('mean', 'sum'):
+            target += block.sum(axis=axis, dtype=np.float64)
+        elif mode == 'rms':
+            target += np.square(block, dtype=np.float64).sum(axis=axis)
+        else:
+            # 絶対値が最大の値を符号付きで取り出し、これまでの値と比較する
+            index = np.expand_dims(np.abs(block).argmax(axis=axis), axis)
+            values = np.take_along_axis(block, index, axis=axis).squeeze(axis)
+            np.copyto(target, values, where=np.abs(values) > np.abs(target))
+
+    n_axis = headers[unused_axis + 'nodes']
+    if mode == 'mean':
+        projection /= n_axis
+    elif mode == 'rms':
+        projection /= n_axis
+        np.sqrt(projection, out=projection)
+
+    return projection
+
+
+def read_binary_data(file, headers, data_format='binary 4', dtype=None, out=None):
+    """Binary形式 (Binary 4 / Binary 8) でデータを読み込みます"""
     xnodes = headers['xnodes']
     ynodes = headers['ynodes']
     znodes = headers['znodes']
     valuedim = headers['valuedim']
 
-    # OOMMF コントロールナンバーを読み込む（バイナリフォーマット識別用）
-    control_number = struct.unpack('<f', file.read(4))[0]
-    if control_number != 1234567.0:
-        raise ValueError("Invalid OVF control number for Binary format.")
+    file_dtype = read_control_number(file, headers)
 
     # データを格納するためのNumPy配列を初期化
-    data = np.empty((znodes, ynodes, xnodes, valuedim), dtype=np.float32)
+    out_dtype = np.dtype(dtype) if dtype is not None else file_dtype.newbyteorder('=')
+    data = get_output_array((znodes, ynodes, xnodes, valuedim), out_dtype, out)
 
-    # データをバイナリ形式で読み込み
-    for z in range(znodes):
-        for y in range(ynodes):
-            for x in range(xnodes):
-                data[z, y, x, :] = struct.unpack('<' + 'f' * valuedim, file.read(4 * valuedim))
+    read_into_array(file, data, file_dtype)
 
     return data
 
 
-def read_text_data(file, headers):
-    """Text形式でデータを読み込みます"""
+def memmap_binary_data(filename, file, headers, data_format):
+    """Binary形式のデータセクションを読み取り専用のメモリマップとして返します"""
+    # コントロールナンバーのみを確認 (データ本体は読み込まない)
+    file_dtype = read_control_number(file, headers)
+
+    shape = (headers['znodes'], headers['ynodes'], headers['xnodes'], headers['valuedim'])
+    return np.memmap(filename, dtype=file_dtype, mode='r', offset=headers['data_offset'], shape=shape)
+
+
+def read_into_array(file, out, file_dtype):
+    """
+    ファイルの現在位置から out の要素数分のデータを読み込み、out に格納します。
+
+    out の dtype がファイル上の dtype と一致する場合は out に直接読み込み、
+    異なる場合は一時バッファに読み込みながら変換します。
+    圧縮ファイルでも全体を展開した一時データを作らないよう、
+    どちらの場合も CHUNK_SIZE ごとに読み込みます。
+    """
+    file_dtype = np.dtype(file_dtype)
+
+    if out.dtype == file_dtype:
+        # データブロックを配列に直接読み込む
+        readinto_exact(file, out)
+        return out
+
+    # 型変換 (精度・エンディアン) が必要な場合はチャンク単位で変換
+    out_flat = out.reshape(-1)
+    chunk_items = max(1, CHUNK_SIZE // file_dtype.itemsize)
+    buffer = np.empty(min(chunk_items, out_flat.size), dtype=file_dtype)
+    for start in range(0, out_flat.size, chunk_items):
+        count = min(chunk_items, out_flat.size - start)
+        readinto_exact(file, buffer[:count])
+        out_flat[start:start + count] = buffer[:count]
+
+    return out
+
+
+def readinto_exact(file, buffer):
+    """buffer が埋まるまで CHUNK_SIZE ごとに読み込みます (途中で終端に達した場合はエラー)"""
+    view = memoryview(buffer).cast('B')
+    filled = 0
+    while filled < len(view):
+        read_size = file.readinto(view[filled:filled + CHUNK_SIZE])
+        if not read_size:
+            raise ValueError("Unexpected end of file in data section.")
+        filled += read_size
+
+
+def read_text_data(file, headers, dtype=None, out=None):
+    """
+    Text形式でデータを読み込みます。
+
+    データセクションを TEXT_CHUNK_SIZE ごとに読み込み、チャンク単位で
+    まとめて数値に変換して出力配列に書き込みます。'# End: Data' の行で
+    読み込みを終了し、file の位置はその行の先頭になります。
+    """
     xnodes = headers['xnodes']
     ynodes = headers['ynodes']
     znodes = headers['znodes']
     valuedim = headers['valuedim']
 
     # データを格納するためのNumPy配列を初期化
-    data = np.empty((znodes, ynodes, xnodes, valuedim), dtype=np.float32)
+    data = get_output_array((znodes, ynodes, xnodes, valuedim), dtype if dtype is not None else np.float32, out)
+    data_flat = data.reshape(-1)
+    filled = 0
+
+    pending = b''
+    pending_pos = file.tell()  # pending の先頭のファイル位置
+    is_end = False
+
+    while not is_end:
+        chunk = file.read(TEXT_CHUNK_SIZE)
+        buffer = pending + chunk
+        if chunk:
+            # 末尾の不完全な行は次のチャンクへ持ち越す
+            cut = buffer.rfind(b'\n') + 1
+            if cut == 0:
+                pending = buffer
+                continue
+        else:
+            cut = len(buffer)
+            is_end = True
 
-    line = file.readline().split()
+        block, pending = buffer[:cut], buffer[cut:]
+        block_pos = pending_pos
+        pending_pos += cut
 
-    # データをテキスト形式で読み込み
-    for z in range(znodes):
-        for y in range(ynodes):
-            for x in range(xnodes):
-                data[z, y, x, :] = [float(val) for val in line[:valuedim]]
+        # コメント ('#' 以降) を除外しながら数値部分を変換
+        start = 0
+        while True:
+            comment = block.find(b'#', start)
+            filled = store_text_values(block[start:] if comment < 0 else block[start:comment], data_flat, filled)
+            if comment < 0:
+                break
+
+            line_end = block.find(b'\n', comment)
+            line_end = len(block) if line_end < 0 else line_end + 1
+            if block[comment:line_end].lstrip(b'#').strip().lower().startswith(b'end: data'):
+                # データセクションの終端行の先頭に位置を戻す
+                file.seek(block_pos + comment)
+                is_end = True
+                break
+            start = line_end
+
+    if filled != data_flat.size:
+        raise ValueError("Unexpected end of file in data section.")
 
     return data
 
+
+def store_text_values(text, data_flat, filled):
+    """空白区切りの数値テキストをまとめて変換し、data_flat の filled 以降に格納します"""
+    values = np.array(text.split(), dtype=np.float64)
+    if filled + values.size > data_flat.size:
+        raise ValueError("Too many values in data section.")
+    data_flat[filled:filled + values.size] = values
+    return filled + values.size